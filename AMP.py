@@ -1,18 +1,143 @@
 import numpy as np
 from VoiceManager import VoiceManager
 import librosa
+import EFX
+import os
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from scipy import signal
+from typing import Union
 
 
-def get_pitch(voice_manager: VoiceManager) -> float:
+class PitchCache:
+    """
+    音高检测结果缓存，按音频内容寻址
+
+    键由音频内容哈希（int16 数据 + 采样率）和 fmin/fmax 组成。
+    内存中是有界 LRU；指定 cache_dir 时同时落盘，跨运行复用。
+    """
+
+    def __init__(self, max_entries: int = 256, cache_dir: Union[str, None] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(voice_manager: VoiceManager, fmin: float, fmax: float) -> str:
+        return f"{voice_manager.content_hash()}_{fmin:.4f}_{fmax:.4f}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Union[float, None]:
+        """
+        查询缓存，未命中返回 None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.cache_dir is not None:
+            try:
+                with open(self._disk_path(key), "r") as f:
+                    pitch = float(json.load(f)["pitch"])
+            except (OSError, ValueError, KeyError):
+                pitch = None
+            if pitch is not None:
+                self._remember(key, pitch)
+                with self._lock:
+                    self.hits += 1
+                return pitch
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, pitch: float):
+        """
+        写入缓存（内存，以及可选的磁盘）
+        """
+        self._remember(key, pitch)
+
+        if self.cache_dir is not None:
+            # 先写临时文件再替换，避免并发进程读到半个文件
+            tmp_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"pitch": pitch}, f)
+            os.replace(tmp_path, self._disk_path(key))
+
+    def _remember(self, key: str, pitch: float):
+        with self._lock:
+            self._entries[key] = pitch
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        清空内存缓存和磁盘缓存
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+        if self.cache_dir is not None:
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith(".json"):
+                    os.remove(os.path.join(self.cache_dir, filename))
+
+
+_pitch_cache = PitchCache()
+
+
+def get_pitch_cache() -> PitchCache:
+    return _pitch_cache
+
+
+def set_pitch_cache(cache: PitchCache):
+    """
+    替换全局音高缓存，例如换成带 cache_dir 的磁盘缓存
+    """
+    global _pitch_cache
+    _pitch_cache = cache
+
+
+def get_pitch(
+    voice_manager: VoiceManager,
+    fmin: float = librosa.note_to_hz("C2"),  # 最低频率约65.41 Hz
+    fmax: float = librosa.note_to_hz("C7"),  # 最高频率约2093 Hz
+    use_cache: bool = True,
+) -> float:
     """
     检测单个音高（基频）
 
     Args:
         voice_manager: VoiceManager对象，包含音频数据
+        fmin: 检测的最低频率（Hz）
+        fmax: 检测的最高频率（Hz）
+        use_cache: 是否使用音高缓存，相同内容的音频不会重复运行 pyin
 
     Returns:
         float: 检测到的音高频率（Hz）
     """
+    if use_cache:
+        key = PitchCache.make_key(voice_manager, fmin, fmax)
+        cached_pitch = _pitch_cache.get(key)
+        if cached_pitch is not None:
+            return cached_pitch
+
     left_channel, right_channel = voice_manager.get_audio_array()
     left_channel = left_channel.astype(np.float32)
 
@@ -20,8 +145,8 @@ def get_pitch(voice_manager: VoiceManager) -> float:
     pitch, voiced_flag, voiced_probs = librosa.pyin(
         y=left_channel,
         sr=voice_manager.rate,
-        fmin=librosa.note_to_hz("C2"),  # 最低频率约65.41 Hz
-        fmax=librosa.note_to_hz("C7"),  # 最高频率约2093 Hz
+        fmin=fmin,
+        fmax=fmax,
     )
 
     # 返回有声音段的中位数音高，如果全部为NaN则返回NaN
@@ -31,7 +156,12 @@ def get_pitch(voice_manager: VoiceManager) -> float:
     if np.isnan(pitch_median):
         pitch_median = np.nanmax(pitch)
 
-    return float(pitch_median) if not np.isnan(pitch_median) else 0.0
+    pitch_median = float(pitch_median) if not np.isnan(pitch_median) else 0.0
+
+    if use_cache:
+        _pitch_cache.put(key, pitch_median)
+
+    return pitch_median
 
 
 def tune_resample(voice_manager: VoiceManager, factor: float) -> VoiceManager:
@@ -42,57 +172,208 @@ def tune_resample(voice_manager: VoiceManager, factor: float) -> VoiceManager:
     sample_rate_target = int(sample_rate_original * factor)
 
     voice_manager_new = VoiceManager(
-        left_channel=voice_manager.left_channel,
-        right_channel=voice_manager.right_channel,
-        sample_rate=sample_rate_target,
+        channel_data=voice_manager.channel_data, sample_rate=sample_rate_target
     )
 
     return voice_manager_new
 
 
-def tune(
-    voice_manager: VoiceManager, steps: float, bins_per_octave: int = 12
-) -> VoiceManager:
-    wav_data_left = voice_manager.left_channel
-    if voice_manager.right_channel is not None:
-        wav_data_right = voice_manager.right_channel
-    else:
-        wav_data_right = None
+# 变调质量档位，从慢到快
+QUALITIES = ("high", "medium", "low")
 
-    wav_data_left = wav_data_left.astype(np.float32)
-    if wav_data_right is not None:
-        wav_data_right = wav_data_right.astype(np.float32)
 
-    wav_data_tuned_left = librosa.effects.pitch_shift(
-        wav_data_left,
-        sr=voice_manager.rate,
-        n_steps=steps,
-        bins_per_octave=bins_per_octave,
+def _stack_channels(voice_manager: VoiceManager) -> np.ndarray:
+    """所有声道组成的 (channels, frames) float32 数组，归一化到 [-1, 1]"""
+    return voice_manager.float_data()
+
+
+def _analyse(voice_manager: VoiceManager) -> np.ndarray:
+    """
+    对音频做一次 STFT 分析，左右声道堆叠成 (channels, frames) 一起处理
+    """
+    return librosa.stft(_stack_channels(voice_manager))
+
+
+def _varispeed(data: np.ndarray, ratio: float) -> np.ndarray:
+    """
+    变速重采样（类似磁带变速）：音高乘以 ratio，时长变为原来的 1/ratio
+
+    使用多相窗函数 sinc 滤波（resample_poly），ratio 用分母不超过 1000 的分数近似，
+    音高误差远小于 1 音分
+    """
+    fraction = _varispeed_fraction(ratio)
+    return signal.resample_poly(data, fraction.numerator, fraction.denominator, axis=-1)
+
+
+def _varispeed_fraction(ratio: float) -> Fraction:
+    return Fraction(1.0 / ratio).limit_denominator(1000)
+
+
+def varispeed_fraction(steps: float, bins_per_octave: int = 12) -> Fraction:
+    """
+    low 档实际使用的重采样比 up / down（输出帧数与输入帧数之比）
+    """
+    return _varispeed_fraction(2.0 ** (float(steps) / bins_per_octave))
+
+
+def tuned_frames(
+    frames: int, steps: float, bins_per_octave: int = 12, quality: str = "high"
+) -> int:
+    """
+    变调结果的帧数：只有 low 档会改变时长
+    """
+    if quality != "low":
+        return frames
+    fraction = varispeed_fraction(steps, bins_per_octave)
+    # 与 resample_poly 的输出长度一致：向上取整
+    return -(-frames * fraction.numerator // fraction.denominator)
+
+
+def _shift_fast(
+    data: np.ndarray, steps: float, bins_per_octave: int, quality: str
+) -> np.ndarray:
+    """
+    不经过 STFT 的快速变调
+
+    low: 只做变速重采样，时长随音高改变
+    medium: 先用 WSOLA 把时长拉伸 ratio 倍，再变速重采样回原长度
+    """
+    ratio = 2.0 ** (float(steps) / bins_per_octave)
+    if quality == "low":
+        return _varispeed(data, ratio)
+    stretched = EFX.wsola(data, 1.0 / ratio)
+    return librosa.util.fix_length(_varispeed(stretched, ratio), size=data.shape[-1])
+
+
+def _synthesize(
+    stft: np.ndarray, n_samples: int, sr: int, steps: float, bins_per_octave: int
+) -> np.ndarray:
+    """
+    由共享的 STFT 合成一个变调结果，与 librosa.effects.pitch_shift 等价：
+    相位声码器拉伸 -> ISTFT -> 重采样回原长度
+    """
+    rate = 2.0 ** (-float(steps) / bins_per_octave)
+    stft_stretch = librosa.phase_vocoder(stft, rate=rate)
+    y_stretch = librosa.istft(
+        stft_stretch, dtype=np.float32, length=int(round(n_samples / rate))
     )
-    if wav_data_right is not None:
-        wav_data_tuned_right = librosa.effects.pitch_shift(
-            wav_data_right,
-            sr=voice_manager.rate,
-            n_steps=steps,
-            bins_per_octave=bins_per_octave,
-        )
+    y_shift = librosa.resample(
+        y_stretch, orig_sr=float(sr) / rate, target_sr=sr, res_type="soxr_hq"
+    )
+    return librosa.util.fix_length(y_shift, size=n_samples)
+
+
+# 进程池 worker 中共享的分析结果，由 initializer 设置，每个 worker 只接收一次
+_worker_analysis = None
+
+
+def _init_worker(stft: np.ndarray, n_samples: int, sr: int, bins_per_octave: int):
+    global _worker_analysis
+    _worker_analysis = (stft, n_samples, sr, bins_per_octave)
+
+
+def _synthesize_in_worker(steps: float) -> np.ndarray:
+    stft, n_samples, sr, bins_per_octave = _worker_analysis
+    return _synthesize(stft, n_samples, sr, steps, bins_per_octave)
+
+
+def tune_many(
+    voice_manager: VoiceManager,
+    steps_list: list,
+    bins_per_octave: int = 12,
+    max_workers: Union[int, None] = None,
+    quality: str = "high",
+) -> list:
+    """
+    一次生成同一音源的多个变调版本
+
+    high 档只做一次 STFT 分析，所有目标共享；每个目标的合成分散到进程池中。
+    重复的 steps 只计算一次。
+
+    Args:
+        voice_manager: VoiceManager对象，包含音频数据
+        steps_list: 每个变调版本的半音步数
+        bins_per_octave: 每八度的音阶数，默认12（半音）
+        max_workers: 进程数，默认取 CPU 核数；为 1 时在当前进程串行计算（只用于 high 档）
+        quality: 质量档位，见 tune
+
+    Returns:
+        list[VoiceManager]: 与 steps_list 顺序一一对应的调音结果
+    """
+    if quality not in QUALITIES:
+        raise ValueError(f"未知的质量档位: {quality}，可选 {QUALITIES}")
+    if len(steps_list) == 0:
+        return []
+
+    sr = voice_manager.rate
+    unique_steps = sorted(set(float(steps) for steps in steps_list))
+
+    if quality != "high":
+        data = _stack_channels(voice_manager)
+        tuned = {
+            steps: _shift_fast(data, steps, bins_per_octave, quality)
+            for steps in unique_steps
+        }
+        return [
+            voice_manager.with_float_data(tuned[float(steps)]) for steps in steps_list
+        ]
+
+    stft = _analyse(voice_manager)
+    n_samples = voice_manager.frames
+
+    if max_workers is None:
+        max_workers = min(len(unique_steps), os.cpu_count() or 1)
+
+    if max_workers <= 1 or len(unique_steps) == 1:
+        results = [
+            _synthesize(stft, n_samples, sr, steps, bins_per_octave)
+            for steps in unique_steps
+        ]
     else:
-        wav_data_tuned_right = None
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(stft, n_samples, sr, bins_per_octave),
+        ) as executor:
+            results = list(executor.map(_synthesize_in_worker, unique_steps))
 
-    wav_data_tuned_left = wav_data_tuned_left.astype(np.int16)
-    if wav_data_tuned_right is not None:
-        wav_data_tuned_right = wav_data_tuned_right.astype(np.int16)
+    tuned = dict(zip(unique_steps, results))
+    return [voice_manager.with_float_data(tuned[float(steps)]) for steps in steps_list]
 
-    voice_manager_new = VoiceManager(
-        left_channel=wav_data_tuned_left,
-        right_channel=wav_data_tuned_right,
-        sample_rate=voice_manager.rate,
-    )
-    return voice_manager_new
+
+def tune(
+    voice_manager: VoiceManager,
+    steps: float,
+    bins_per_octave: int = 12,
+    quality: str = "high",
+) -> VoiceManager:
+    """
+    变调
+
+    质量档位（单核上对 48kHz 立体声的大致速度，实时倍数）：
+        high: 相位声码器 + soxr 重采样，时长不变，音质最好，约 30x 实时
+        medium: WSOLA 拉伸 + 多相重采样，时长不变，瞬态更干净但和声略有颗粒感，约 70x 实时
+        low: 只做多相重采样（变速），时长随音高改变，适合短促音效，约 200x 实时
+
+    Args:
+        voice_manager: VoiceManager对象，包含音频数据
+        steps: 半音步数
+        bins_per_octave: 每八度的音阶数，默认12（半音）
+        quality: "high"、"medium" 或 "low"
+
+    Returns:
+        VoiceManager: 调音后的VoiceManager对象
+    """
+    return tune_many(
+        voice_manager, [steps], bins_per_octave, max_workers=1, quality=quality
+    )[0]
 
 
 def precise_tune(
-    voice_manager: VoiceManager, target_pitch: float, bins_per_octave: int = 12
+    voice_manager: VoiceManager,
+    target_pitch: float,
+    bins_per_octave: int = 12,
+    quality: str = "high",
 ) -> VoiceManager:
     """
     将音频调成指定的目标音高
@@ -101,10 +382,26 @@ def precise_tune(
         voice_manager: VoiceManager对象，包含音频数据
         target_pitch: 目标音高频率（Hz）
         bins_per_octave: 每八度的音阶数，默认12（半音）
+        quality: 质量档位，见 tune
 
     Returns:
         VoiceManager: 调音后的VoiceManager对象
 
+    Raises:
+        ValueError: 如果无法检测当前音高或目标音高无效
+    """
+    steps = steps_to_pitch(voice_manager, target_pitch, bins_per_octave)
+
+    # 使用tune函数进行调音
+    return tune(voice_manager, steps, bins_per_octave, quality)
+
+
+def steps_to_pitch(
+    voice_manager: VoiceManager, target_pitch: float, bins_per_octave: int = 12
+) -> float:
+    """
+    计算把音频调到目标音高需要的步数
+
     Raises:
         ValueError: 如果无法检测当前音高或目标音高无效
     """
@@ -123,7 +420,46 @@ def precise_tune(
 
     # 计算需要调整的半音步数
     # 公式：steps = 12 * log2(目标频率 / 当前频率)
-    steps = bins_per_octave * np.log2(target_pitch / current_pitch)
+    return bins_per_octave * np.log2(target_pitch / current_pitch)
 
-    # 使用tune函数进行调音
-    return tune(voice_manager, steps, bins_per_octave)
+
+def precise_tune_many(
+    voice_manager: VoiceManager,
+    target_pitches: list,
+    bins_per_octave: int = 12,
+    max_workers: Union[int, None] = None,
+    quality: str = "high",
+) -> list:
+    """
+    将同一音频分别调成多个目标音高，是 precise_tune 的批量版本
+
+    Args:
+        voice_manager: VoiceManager对象，包含音频数据
+        target_pitches: 目标音高频率列表（Hz）
+        bins_per_octave: 每八度的音阶数，默认12（半音）
+        max_workers: 进程数，见 tune_many
+        quality: 质量档位，见 tune
+
+    Returns:
+        list[VoiceManager]: 与 target_pitches 顺序一一对应的调音结果
+
+    Raises:
+        ValueError: 如果无法检测当前音高或目标音高无效
+    """
+    current_pitch = get_pitch(voice_manager)
+
+    if current_pitch <= 0:
+        raise ValueError(
+            f"无法检测当前音高（检测结果为 {current_pitch} Hz），无法进行调音"
+        )
+
+    for target_pitch in target_pitches:
+        if target_pitch <= 0:
+            raise ValueError(f"目标音高无效（{target_pitch} Hz），必须大于0")
+
+    steps_list = [
+        bins_per_octave * np.log2(target_pitch / current_pitch)
+        for target_pitch in target_pitches
+    ]
+
+    return tune_many(voice_manager, steps_list, bins_per_octave, max_workers, quality)
@@ -0,0 +1,120 @@
+import os
+import threading
+import wave
+from typing import Union
+from VoiceManager import VoiceManager
+
+
+class AssetInfo:
+    """只从 WAV 文件头读取的元数据，不解码采样"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        with wave.open(path, "rb") as wf:
+            self.channels = wf.getnchannels()
+            self.rate = wf.getframerate()
+            self.frames = wf.getnframes()
+            self.sampwidth = wf.getsampwidth()
+        self.duration = self.frames / self.rate
+
+    def __repr__(self) -> str:
+        return (
+            f"AssetInfo({self.name!r}, {self.channels}ch, {self.rate}Hz, "
+            f"{self.duration:.2f}s)"
+        )
+
+
+class AssetBank:
+    """
+    音频素材库
+
+    创建时扫描目录一次，只读取各 WAV 文件头建立索引（时长、声道数等）。
+    每个文件第一次使用时以内存映射方式加载，之后所有使用者共享同一块只读缓冲区；
+    get 返回的是共享缓冲区上的轻量 VoiceManager 视图，每个视图有自己的播放状态，
+    重复使用同一素材不会再次读文件，也不会增加文件句柄。
+    """
+
+    def __init__(self, directory: str = "assets", extension: str = ".wav"):
+        self.directory = directory
+        self._index = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+        for filename in sorted(os.listdir(directory)):
+            if filename.lower().endswith(extension):
+                self._index[filename] = AssetInfo(
+                    filename, os.path.join(directory, filename)
+                )
+
+    def names(self) -> list:
+        """按文件名排序的素材名列表"""
+        return list(self._index)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def info(self, name: str) -> AssetInfo:
+        if name not in self._index:
+            raise KeyError(f"素材不存在: {name}")
+        return self._index[name]
+
+    def _load(self, name: str) -> VoiceManager:
+        info = self.info(name)
+        with self._lock:
+            if name not in self._loaded:
+                if info.sampwidth == 2:
+                    voice = VoiceManager(name=name, wave_filename=info.path, mmap=True)
+                else:
+                    voice = VoiceManager(name=name, wave_filename=info.path)
+                self._loaded[name] = voice
+            return self._loaded[name]
+
+    def get(self, name: str, voice_name: Union[str, None] = None) -> VoiceManager:
+        """
+        返回素材的 VoiceManager 视图（与其他视图共享采样，不拷贝）
+
+        Args:
+            name: 素材文件名
+            voice_name: 视图的名字，默认为文件名
+        """
+        shared = self._load(name)
+        return VoiceManager(
+            name=voice_name if voice_name is not None else name,
+            channel_data=shared.channel_data,
+            sample_rate=shared.rate,
+        )
+
+    def preload(self, names: Union[list, None] = None):
+        """提前映射素材，默认全部"""
+        for name in names if names is not None else self.names():
+            self._load(name)
+
+    def release(self, name: Union[str, None] = None):
+        """
+        释放共享缓冲区（已发出的视图仍然有效，直到它们被回收）；不指定时释放全部
+        """
+        with self._lock:
+            if name is None:
+                self._loaded.clear()
+            else:
+                self._loaded.pop(name, None)
+
+    @property
+    def loaded(self) -> list:
+        with self._lock:
+            return list(self._loaded)
+
+
+_default_banks = {}
+
+
+def get_asset_bank(directory: str = "assets") -> AssetBank:
+    """每个目录共用一个素材库"""
+    directory = os.path.abspath(directory)
+    if directory not in _default_banks:
+        _default_banks[directory] = AssetBank(directory)
+    return _default_banks[directory]
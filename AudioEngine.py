@@ -0,0 +1,296 @@
+import atexit
+import threading
+import time
+import numpy as np
+from typing import Union
+from Timeline import Timeline
+from WavWriter import WavWriter
+
+try:
+    import pyaudio
+except ImportError:  # 没有 PyAudio 时仍可用 NullSink / FileSink 离线渲染
+    pyaudio = None
+
+
+class PyAudioSink:
+    """声卡输出：整个引擎只打开一个 PyAudio 输出流，由回调向引擎拉取数据"""
+
+    realtime = True
+
+    def __init__(self):
+        self._p = None
+        self._stream = None
+
+    def open(self, engine: "AudioEngine"):
+        if pyaudio is None:
+            raise RuntimeError("PyAudio 未安装，无法打开声卡输出")
+        self._p = pyaudio.PyAudio()
+        self._stream = self._p.open(
+            format=pyaudio.paInt16,
+            channels=engine.channels,
+            rate=engine.rate,
+            output=True,
+            frames_per_buffer=engine.block_size,
+            stream_callback=engine.pyaudio_callback,
+        )
+
+    def start(self):
+        self._stream.start_stream()
+
+    def stop(self):
+        self._stream.stop_stream()
+
+    def close(self):
+        self._stream.close()
+        self._p.terminate()
+
+
+class NullSink:
+    """丢弃所有输出，只统计帧数；用于没有声卡时测试引擎"""
+
+    realtime = False
+
+    def __init__(self):
+        self.frames_written = 0
+
+    def open(self, engine: "AudioEngine"):
+        self.frames_written = 0
+
+    def write(self, block: np.ndarray):
+        self.frames_written += block.shape[0]
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """把引擎的输出逐块写入 WAV 文件"""
+
+    realtime = False
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._wf = None
+
+    def open(self, engine: "AudioEngine"):
+        self._wf = WavWriter(self.filename, engine.channels, engine.rate)
+
+    def write(self, block: np.ndarray):
+        self._wf.write_interleaved(block)
+
+    def close(self):
+        self._wf.close()
+
+
+class _Voice:
+    def __init__(self, timeline: Timeline, name: Union[str, None]):
+        self.timeline = timeline
+        self.name = name
+        self.position = 0
+        self.started = False  # 回调中开始发声时置位
+        self.reported = False  # 已在调用者线程中报告过
+
+
+class AudioEngine:
+    """
+    实时分块渲染引擎
+
+    所有正在播放的时间线共用一个输出；每个块由回调从各时间线当前位置渲染并混合，
+    混音和输出缓冲区都预先分配好，回调中不分配与块长度相关的内存。
+    添加的时间线在下一个块就开始发声，首个声音的延迟只取决于块大小。
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 48000,
+        channels: int = 2,
+        block_size: int = 1024,
+        sink=None,
+    ):
+        self.rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.sink = sink if sink is not None else PyAudioSink()
+
+        # 预分配的混音缓冲区 (声道数, 帧数) 和交错输出缓冲区 (帧数, 声道数)
+        self._mix = np.zeros((channels, block_size), dtype=np.int32)
+        self._out = np.zeros((block_size, channels), dtype=np.int16)
+
+        self._voices = {}
+        self._ended = []  # 开始后还没来得及报告就已播放完的时间线
+        self._has_started = False  # 有待报告的开始事件
+        self._next_handle = 0
+        self._lock = threading.Lock()
+        self._running = False
+
+        # 统计信息
+        self.frames_rendered = 0
+        self.underruns = 0  # 声卡报告的输出欠载次数
+        self.xruns = 0  # 渲染耗时超过块时长的次数
+
+    def add(self, timeline: Timeline, name: str = None) -> int:
+        """
+        开始播放一条时间线，返回用于 remove / is_active 的句柄
+        """
+        if timeline.rate is not None and timeline.rate != self.rate:
+            raise ValueError(
+                f"时间线采样率 {timeline.rate}Hz 与引擎采样率 {self.rate}Hz 不一致"
+            )
+        self.report_started()
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._voices[handle] = _Voice(timeline, name)
+        return handle
+
+    def remove(self, handle: int):
+        with self._lock:
+            self._voices.pop(handle, None)
+
+    def is_active(self, handle: int) -> bool:
+        self.report_started()
+        with self._lock:
+            return handle in self._voices
+
+    def report_started(self):
+        """
+        打印回调中开始发声的时间线
+
+        回调持有锁时不做 I/O，只置位；由调用者线程（add、is_active、run）调用本函数报告
+        """
+        if not self._has_started:
+            return
+        with self._lock:
+            self._has_started = False
+            voices = self._ended + list(self._voices.values())
+            self._ended = []
+            names = []
+            for voice in voices:
+                if voice.started and not voice.reported:
+                    voice.reported = True
+                    if voice.name is not None:
+                        names.append(voice.name)
+        for name in names:
+            print(f"{name} start playing")
+
+    @property
+    def active_voices(self) -> int:
+        with self._lock:
+            return len(self._voices)
+
+    def stats(self) -> dict:
+        return {
+            "frames_rendered": self.frames_rendered,
+            "underruns": self.underruns,
+            "xruns": self.xruns,
+            "active_voices": self.active_voices,
+        }
+
+    def _ensure_capacity(self, frame_count: int):
+        # 只有声卡要求的块比预分配的更大时才重新分配（通常只在第一次发生）
+        if frame_count > self._mix.shape[1]:
+            self._mix = np.zeros((self.channels, frame_count), dtype=np.int32)
+            self._out = np.zeros((frame_count, self.channels), dtype=np.int16)
+
+    def render_block(self, frame_count: int) -> np.ndarray:
+        """
+        渲染下一块，返回形状为 (帧数, 声道数) 的 int16 数组
+
+        返回的是预分配输出缓冲区的视图，下一次调用会覆盖它
+        """
+        self._ensure_capacity(frame_count)
+        mix = self._mix[:, :frame_count]
+        mix.fill(0)
+
+        with self._lock:
+            finished = []
+            for handle, voice in self._voices.items():
+                if voice.position == 0:
+                    # 回调中只置标志，由 report_started 在调用者线程中打印
+                    voice.started = True
+                    self._has_started = True
+                voice.timeline.render_into(mix, voice.position)
+                voice.position += frame_count
+                if voice.position >= voice.timeline.frames:
+                    finished.append(handle)
+            for handle in finished:
+                voice = self._voices.pop(handle)
+                if not voice.reported:
+                    self._ended.append(voice)
+
+        np.clip(mix, -(2**15), 2**15 - 1, out=mix)
+        out = self._out[:frame_count]
+        out[...] = mix.T
+        self.frames_rendered += frame_count
+        return out
+
+    def pyaudio_callback(self, in_data, frame_count, time_info, status):
+        """PyAudioSink 使用的回调"""
+        if pyaudio is not None and status & pyaudio.paOutputUnderflow:
+            self.underruns += 1
+
+        started = time.perf_counter()
+        out = self.render_block(frame_count)
+        if time.perf_counter() - started > frame_count / self.rate:
+            self.xruns += 1
+
+        # PyAudio 接受连续的 numpy 数组，直接返回预分配缓冲区，不转换成 bytes
+        return (out, pyaudio.paContinue)
+
+    def start(self):
+        """打开输出；实时输出（声卡）从此开始由回调驱动"""
+        if self._running:
+            return
+        self.sink.open(self)
+        if self.sink.realtime:
+            self.sink.start()
+        self._running = True
+
+    def run(self, max_frames: Union[int, None] = None):
+        """
+        离线驱动非实时输出（NullSink / FileSink）：逐块渲染直到所有时间线播放完毕，
+        或者渲染了 max_frames 帧
+        """
+        if self.sink.realtime:
+            raise RuntimeError("实时输出由声卡回调驱动，不能调用 run")
+        self.start()
+
+        rendered = 0
+        while self.active_voices > 0:
+            # 最后一块只渲染到最长时间线的末尾，输出文件不会多出静音
+            with self._lock:
+                remaining = max(
+                    voice.timeline.frames - voice.position
+                    for voice in self._voices.values()
+                )
+            frame_count = min(self.block_size, remaining)
+            if max_frames is not None:
+                frame_count = min(frame_count, max_frames - rendered)
+                if frame_count <= 0:
+                    break
+            self.sink.write(self.render_block(frame_count))
+            self.report_started()
+            rendered += frame_count
+
+    def close(self):
+        if not self._running:
+            return
+        if self.sink.realtime:
+            self.sink.stop()
+        self.sink.close()
+        self._running = False
+
+
+_default_engines = {}
+
+
+def get_default_engine(sample_rate: int = 48000) -> AudioEngine:
+    """
+    每个采样率共用一个声卡输出引擎，首次使用时打开，程序退出时关闭
+    """
+    if sample_rate not in _default_engines:
+        engine = AudioEngine(sample_rate=sample_rate)
+        engine.start()
+        atexit.register(engine.close)
+        _default_engines[sample_rate] = engine
+    return _default_engines[sample_rate]
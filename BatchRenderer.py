@@ -0,0 +1,174 @@
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Union
+from EffectChain import EffectChain
+from VoiceManager import VoiceManager
+
+# worker 进程中由 initializer 挂载的源音频，每个源只传一次共享内存的名字
+_worker_sources = None
+_worker_shared = None
+
+
+def _attach_sources(descriptors: list):
+    """在 worker 中挂载共享内存中的源音频，构造不拷贝数据的 VoiceManager"""
+    global _worker_sources, _worker_shared
+    _worker_sources = []
+    _worker_shared = []
+    for name, shape, dtype, rate in descriptors:
+        # 进程池的 worker 与主进程共用同一个 resource tracker，共享内存由主进程释放
+        shm = shared_memory.SharedMemory(name=name)
+        data = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        data.flags.writeable = False
+        _worker_shared.append(shm)
+        _worker_sources.append(VoiceManager(channel_data=data, sample_rate=rate))
+
+
+def _seed_job(seed_sequence: np.random.SeedSequence) -> np.random.Generator:
+    # 同时设置全局随机状态，使依赖 random / np.random 的代码也可复现
+    state = seed_sequence.generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(int(state[1]))
+    return np.random.default_rng(seed_sequence)
+
+
+def _run_job(sources: list, job: tuple, seed_sequence: np.random.SeedSequence):
+    source_index, work, optimize = job
+    rng = _seed_job(seed_sequence)
+    source = sources[source_index]
+
+    if isinstance(work, tuple):
+        # 已拆掉源音频的效果链操作序列
+        result = EffectChain(source, work).render(optimize)
+    else:
+        result = work(source, rng)
+    return np.ascontiguousarray(result.channel_data), result.rate
+
+
+def _run_job_in_worker(job_and_seed: tuple):
+    job, seed_sequence = job_and_seed
+    return _run_job(_worker_sources, job, seed_sequence)
+
+
+def _buffer_key(source: VoiceManager) -> tuple:
+    """
+    源音频的去重键：采样所在的内存地址和布局
+
+    AssetBank.get 每次返回新的视图对象，但它们共享同一块采样，按对象 id 去重会重复上传
+    """
+    data = source.channel_data
+    return (
+        data.__array_interface__["data"][0],
+        data.shape,
+        data.strides,
+        data.dtype.str,
+        source.rate,
+    )
+
+
+class BatchRenderer:
+    """
+    并行批量渲染
+
+    每个任务是一个 EffectChain，或者 (源 VoiceManager, 函数) 元组，
+    函数签名为 func(voice_manager, rng) -> VoiceManager，必须是模块级函数以便传给子进程。
+    不同的源音频各放进一块共享内存，只在进程池启动时传一次名字，
+    任务本身只传源编号和操作参数，不会为每个任务重复序列化采样。
+
+    每个任务从 SeedSequence(seed) 派生独立的随机种子，结果与进程数和调度顺序无关；
+    seed 默认为 0，同样的任务每次运行结果相同。结果按任务顺序返回。
+    """
+
+    def __init__(self, max_workers: Union[int, None] = None, seed: int = 0):
+        self.max_workers = max_workers
+        self.seed = seed
+
+    def _split(self, jobs: list, optimize: bool):
+        """把任务拆成 (源列表, [(源编号, 操作序列或函数, optimize)])"""
+        sources = []
+        source_index = {}
+        split_jobs = []
+        for job in jobs:
+            if isinstance(job, EffectChain):
+                source, work = job.source, job.ops
+            else:
+                source, work = job
+            key = _buffer_key(source)
+            if key not in source_index:
+                source_index[key] = len(sources)
+                sources.append(source)
+            split_jobs.append((source_index[key], work, optimize))
+        return sources, split_jobs
+
+    def render(self, jobs: list, optimize: bool = True) -> list:
+        """
+        渲染所有任务
+
+        Args:
+            jobs: EffectChain 或 (VoiceManager, func) 的列表
+            optimize: 效果链是否先优化，见 EffectChain.render
+
+        Returns:
+            list[VoiceManager]: 与 jobs 顺序一一对应的结果
+        """
+        if len(jobs) == 0:
+            return []
+
+        sources, split_jobs = self._split(jobs, optimize)
+        seeds = np.random.SeedSequence(self.seed).spawn(len(split_jobs))
+
+        max_workers = self.max_workers
+        if max_workers is None:
+            max_workers = min(len(split_jobs), os.cpu_count() or 1)
+
+        if max_workers <= 1:
+            results = [
+                _run_job(sources, job, seed) for job, seed in zip(split_jobs, seeds)
+            ]
+        else:
+            results = self._render_in_pool(sources, split_jobs, seeds, max_workers)
+
+        return [
+            VoiceManager(channel_data=data, sample_rate=rate) for data, rate in results
+        ]
+
+    def _render_in_pool(self, sources, split_jobs, seeds, max_workers) -> list:
+        shared = []
+        try:
+            descriptors = []
+            for source in sources:
+                data = source.channel_data
+                shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+                shared.append(shm)
+                np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+                descriptors.append((shm.name, data.shape, data.dtype.str, source.rate))
+
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_attach_sources,
+                initargs=(descriptors,),
+            ) as executor:
+                chunksize = max(1, len(split_jobs) // (4 * max_workers))
+                return list(
+                    executor.map(
+                        _run_job_in_worker,
+                        zip(split_jobs, seeds),
+                        chunksize=chunksize,
+                    )
+                )
+        finally:
+            for shm in shared:
+                shm.close()
+                shm.unlink()
+
+
+def render_batch(
+    jobs: list,
+    max_workers: Union[int, None] = None,
+    seed: int = 0,
+    optimize: bool = True,
+) -> list:
+    """BatchRenderer(max_workers, seed).render(jobs, optimize) 的简写"""
+    return BatchRenderer(max_workers, seed).render(jobs, optimize)
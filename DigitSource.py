@@ -0,0 +1,263 @@
+"""
+常数的任意精度数字源
+
+按需计算 pi、e、sqrt2 等常数的真实十进制数字（与 Mathematica 的 RealDigits 一致，
+从第一个非零数字开始，含整数部分：pi -> 3, 1, 4, 1, 5, ...）。
+内置算法全部在 decimal 模块上用二分分裂（binary splitting）求和，大数乘法由 libmpdec 的
+数论变换完成；其它常数在安装了 mpmath 时由 mpmath 计算。
+算过的数字以原始字节保存在磁盘缓存中，之后以内存映射方式读取，按下标取数字是 O(1)。
+"""
+
+import decimal
+import math
+import os
+import threading
+import numpy as np
+from typing import Union
+
+try:
+    import mpmath
+except ImportError:  # 没有 mpmath 时只能使用内置常数
+    mpmath = None
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache", "digits"
+)
+# 扩展缓存时至少多算这么多位，且至少翻倍，摊销重新计算的开销
+MIN_CHUNK = 10000
+# 计算时多保留的位数，避免末位舍入影响返回的数字
+GUARD_DIGITS = 10
+
+_CHUDNOVSKY_A = 13591409
+_CHUDNOVSKY_B = 545140134
+_CHUDNOVSKY_C3_24 = 640320**3 // 24
+
+
+def _context(prec: int = decimal.MAX_PREC) -> decimal.Context:
+    # 默认的最大精度下整数运算是精确的，相当于基于 libmpdec 的大整数；
+    # 指数范围也取最大，百万位以上的中间结果不会溢出
+    return decimal.Context(prec=prec, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+
+def _chudnovsky(a: int, b: int) -> tuple:
+    """Chudnovsky 级数第 a..b-1 项的二分分裂 (P, Q, T)"""
+    if b - a == 1:
+        if a == 0:
+            p = q = decimal.Decimal(1)
+        else:
+            p = decimal.Decimal((6 * a - 5) * (2 * a - 1) * (6 * a - 1))
+            q = decimal.Decimal(a * a * a * _CHUDNOVSKY_C3_24)
+        t = p * (_CHUDNOVSKY_A + _CHUDNOVSKY_B * a)
+        return p, q, -t if a & 1 else t
+    m = (a + b) // 2
+    p1, q1, t1 = _chudnovsky(a, m)
+    p2, q2, t2 = _chudnovsky(m, b)
+    return p1 * p2, q1 * q2, t1 * q2 + p1 * t2
+
+
+def _factorial_series(a: int, b: int) -> tuple:
+    """sum(1 / k!, k = a+1..b) 的二分分裂 (P, Q)，值为 P / Q * a!"""
+    if b - a == 1:
+        return decimal.Decimal(1), decimal.Decimal(b)
+    m = (a + b) // 2
+    p1, q1 = _factorial_series(a, m)
+    p2, q2 = _factorial_series(m, b)
+    return p1 * q2 + p2, q1 * q2
+
+
+def _sqrt(value: int, prec: int) -> decimal.Decimal:
+    """
+    sqrt(value)：先用牛顿迭代求 1 / sqrt(value) 再乘以 value；
+    每步精度翻倍且只用乘法，比 Context.sqrt 快得多
+    """
+    precs = []
+    while prec > 30:
+        precs.append(prec)
+        prec = prec // 2 + 2
+    ctx = _context(prec)
+    y = ctx.divide(1, ctx.sqrt(decimal.Decimal(value)))
+    half_value = decimal.Decimal(value) / 2
+    for prec in reversed(precs):
+        ctx = _context(prec)
+        # y <- y * (3 - value * y^2) / 2
+        y = ctx.multiply(
+            y,
+            ctx.subtract(
+                decimal.Decimal("1.5"), ctx.multiply(half_value, ctx.multiply(y, y))
+            ),
+        )
+    return ctx.multiply(y, value)
+
+
+def _pi(count: int) -> decimal.Decimal:
+    # 每项约贡献 14.18 位
+    terms = count // 14 + 2
+    with decimal.localcontext(_context()):
+        _, q, t = _chudnovsky(0, terms)
+    ctx = _context(count + GUARD_DIGITS)
+    sqrt_10005 = _sqrt(10005, count + GUARD_DIGITS)
+    return ctx.divide(ctx.multiply(ctx.multiply(q, 426880), sqrt_10005), t)
+
+
+def _e(count: int) -> decimal.Decimal:
+    # 取足够多的项使 terms! > 10^(count + GUARD_DIGITS)
+    terms = 2
+    while math.lgamma(terms + 1) / math.log(10) < count + GUARD_DIGITS:
+        terms *= 2
+    with decimal.localcontext(_context()):
+        p, q = _factorial_series(0, terms)
+    ctx = _context(count + GUARD_DIGITS)
+    return ctx.add(1, ctx.divide(p, q))
+
+
+def _sqrt2(count: int) -> decimal.Decimal:
+    return _sqrt(2, count + GUARD_DIGITS)
+
+
+CONSTANTS = {"pi": _pi, "e": _e, "sqrt2": _sqrt2}
+
+
+def _mpmath_digits(name: str, count: int) -> str:
+    if mpmath is None:
+        raise KeyError(f"未知常数: {name}（安装 mpmath 可使用更多常数）")
+    with mpmath.workdps(count + GUARD_DIGITS):
+        x = getattr(mpmath.mp, name)
+        if callable(x):
+            x = x()
+        exponent = int(mpmath.floor(mpmath.log10(abs(x))))
+        scaled = mpmath.floor(abs(x) * mpmath.mpf(10) ** (count - 1 - exponent))
+        # 经 Decimal 转成字符串，不受 int 转 str 的位数限制
+        return str(decimal.Decimal(int(scaled)))
+
+
+def compute_digits(name: str, count: int) -> np.ndarray:
+    """
+    直接计算常数的前 count 位数字（不使用缓存）
+
+    Returns:
+        np.ndarray: uint8 数组，每个元素是一位十进制数字
+    """
+    if name in CONSTANTS:
+        # "3.1415..." -> "31415..."；这些常数都大于 1，不会有前导零
+        text = str(CONSTANTS[name](count)).replace(".", "")
+    else:
+        text = _mpmath_digits(name, count)
+    digits = np.frombuffer(text[:count].encode("ascii"), dtype=np.uint8) - ord("0")
+    if len(digits) < count:
+        raise ValueError(f"{name} 只算出了 {len(digits)} 位")
+    return digits
+
+
+class DigitSource:
+    """
+    某个常数的数字序列
+
+    需要更多数字时一次至少多算 MIN_CHUNK 位并至少翻倍，结果写入磁盘缓存
+    （cache_dir/<name>.u8，每位一个字节），之后内存映射读取；
+    cache_dir 为 None 时只保存在内存中。
+
+    用法::
+
+        pi = DigitSource("pi")
+        pi[100000]            # 第 100000 位（从 0 开始，pi[0] == 3）
+        pi.digits(1000)       # 前 1000 位
+        for d in pi.stream(): # 惰性地逐位生成
+            ...
+    """
+
+    def __init__(self, name: str, cache_dir: Union[str, None] = DEFAULT_CACHE_DIR):
+        if name not in CONSTANTS and mpmath is None:
+            raise KeyError(f"未知常数: {name}（安装 mpmath 可使用更多常数）")
+        self.name = name
+        self.cache_dir = cache_dir
+        self._digits = np.zeros(0, dtype=np.uint8)
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            self._load()
+
+    @property
+    def path(self) -> Union[str, None]:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"{self.name}.u8")
+
+    def _load(self):
+        try:
+            if os.path.getsize(self.path) > len(self._digits):
+                self._digits = np.memmap(self.path, dtype=np.uint8, mode="r")
+        except OSError:
+            pass
+
+    def _save(self, digits: np.ndarray):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 先写临时文件再替换，其它进程不会读到写了一半的缓存
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        digits.tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        """已经算出（或缓存中已有）的位数"""
+        return len(self._digits)
+
+    def ensure(self, count: int):
+        """保证至少已有 count 位"""
+        if count <= len(self._digits):
+            return
+        with self._lock:
+            if self.cache_dir is not None:
+                # 其它进程可能已经算得更多
+                self._load()
+            if count <= len(self._digits):
+                return
+            count = max(count, 2 * len(self._digits), len(self._digits) + MIN_CHUNK)
+            digits = compute_digits(self.name, count)
+            if self.cache_dir is not None:
+                self._save(digits)
+            self._digits = digits
+
+    def digits(self, count: int, start: int = 0) -> np.ndarray:
+        """
+        第 start 位起的 count 位数字
+
+        Returns:
+            np.ndarray: uint8 数组（缓存上的只读视图）
+        """
+        self.ensure(start + count)
+        return self._digits[start : start + count]
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            if index.stop is None or index.stop < 0 or (index.start or 0) < 0:
+                raise IndexError("数字序列是无限长的，切片必须给出非负的起止位置")
+            self.ensure(index.stop)
+            return self._digits[index]
+        if index < 0:
+            raise IndexError("数字序列是无限长的，不支持负下标")
+        self.ensure(index + 1)
+        return int(self._digits[index])
+
+    def stream(self, start: int = 0, block: int = 4096):
+        """
+        从第 start 位起逐位生成数字的无限生成器，每次按块向后取
+        """
+        position = start
+        while True:
+            for digit in self.digits(block, position).tolist():
+                yield digit
+            position += block
+
+    def __iter__(self):
+        return self.stream()
+
+
+_default_sources = {}
+
+
+def get_digit_source(
+    name: str, cache_dir: Union[str, None] = DEFAULT_CACHE_DIR
+) -> DigitSource:
+    """每个常数（和缓存目录）共用一个数字源"""
+    key = (name, cache_dir)
+    if key not in _default_sources:
+        _default_sources[key] = DigitSource(name, cache_dir)
+    return _default_sources[key]
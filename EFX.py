@@ -1,36 +1,25 @@
 import numpy as np
-from VoiceManager import VoiceManager
+from VoiceManager import VoiceManager, quantize
 import matplotlib.pyplot as plt
 from typing import Tuple
 from typing import Union
 import librosa
+from scipy import signal
+import FILTER
 
 def inverse(voice_manager: VoiceManager) -> VoiceManager:
     """
-    Inverse the left channel and right channel
-    """
-    left_channel, right_channel = voice_manager.get_audio_array()
-    sample_rate = voice_manager.rate
-
-    left_channel_inverse = np.zeros_like(left_channel)
-    right_channel_inverse = None
-    for i in range(len(left_channel)):
-        left_channel_inverse[i] = left_channel[len(left_channel) - i - 1]
+    Inverse all channels
 
-    if right_channel is not None:
-        right_channel_inverse = np.zeros_like(right_channel)
-        for i in range(len(right_channel)):
-            right_channel_inverse[i] = right_channel[len(right_channel) - i - 1]
-
-    return VoiceManager(left_channel=left_channel_inverse,
-                        right_channel=right_channel_inverse,
-                        sample_rate=sample_rate)
+    The reversed channels are a negative-stride view of the source, no samples are copied
+    """
+    return VoiceManager(channel_data=voice_manager.channel_data[:, ::-1],
+                        sample_rate=voice_manager.rate)
 
 def cut(voice_manager: VoiceManager, start_time: float, end_time: float) -> VoiceManager:
     """
     Cut the voice from start time to end time
     """
-    left_channel, right_channel = voice_manager.get_audio_array()
     sample_rate = voice_manager.rate
     duration = voice_manager.duration
 
@@ -42,24 +31,19 @@ def cut(voice_manager: VoiceManager, start_time: float, end_time: float) -> Voic
     start_index = int(start_time * sample_rate)
     end_index = int(end_time * sample_rate)
 
-    left_channel_cut = left_channel[start_index:end_index]
-    if right_channel is not None:
-        right_channel_cut = right_channel[start_index:end_index]
-    else:
-        right_channel_cut = None
-
-    return VoiceManager(left_channel=left_channel_cut, right_channel=right_channel_cut, sample_rate=sample_rate)
+    return VoiceManager(channel_data=voice_manager.channel_data[:, start_index:end_index],
+                        sample_rate=sample_rate)
 
 def FFT(voice_manager: VoiceManager, display: bool = False) -> Tuple[np.array, Union[np.array, None]]:
     """
     FFT the voice
     """
-    left_channel, right_channel = voice_manager.get_audio_array()
+    right_channel = voice_manager.right_channel
 
-    left_channel_FFT = np.fft.fft(left_channel)
-    right_channel_FFT = None
-    if right_channel is not None:
-        right_channel_FFT = np.fft.fft(right_channel)
+    # all channels in one call, the tuple return is kept for callers
+    channels_FFT = np.fft.fft(voice_manager.channel_data, axis=-1)
+    left_channel_FFT = channels_FFT[0]
+    right_channel_FFT = channels_FFT[1] if len(channels_FFT) > 1 else None
 
     if display:
         plt.figure(figsize=(12, 6))
@@ -86,97 +70,348 @@ def IFFT(FFT_array: np.array) -> np.array:
     """
     return np.fft.ifft(FFT_array)
 
-def filter(voice_manager: VoiceManager, low_freq: float, high_freq: float) -> VoiceManager:
+def filter(voice_manager: VoiceManager, low_freq: float, high_freq: float, method: str = "fir") -> VoiceManager:
     """
-    Filter the voice by low frequency and high frequency
-    """
-    sample_rate = voice_manager.rate
-    left_channel_FFT, right_channel_FFT = FFT(voice_manager)
+    Filter the voice by low frequency and high frequency, both in Hz
 
-    if high_freq == -1:
-        high_freq = len(left_channel_FFT)
+    low_freq <= 0 disables the low cut, high_freq == -1 disables the high cut.
+    All channels are filtered in one call along the last axis.
 
-    # 创建滤波淹掩膜
-    filter_mask = np.zeros_like(left_channel_FFT, dtype=complex)
-    filter_mask[low_freq:high_freq] = 1 + 0j
-
-    # 应用滤波掩膜
-    left_channel_FFT_new = left_channel_FFT * filter_mask
-    left_channel = np.real(IFFT(left_channel_FFT_new)).astype(np.int16)
+    Args:
+        voice_manager: VoiceManager object containing audio data
+        low_freq: Low cutoff frequency in Hz
+        high_freq: High cutoff frequency in Hz
+        method: "fir" (linear phase, overlap-add), "iir" (Butterworth SOS biquads)
+                or "fft" (brick-wall mask on a real FFT of the whole clip)
 
-    if right_channel_FFT is not None:
-        right_channel_FFT_new = right_channel_FFT * filter_mask
-        right_channel = np.real(IFFT(right_channel_FFT_new)).astype(np.int16)
+    Returns:
+        VoiceManager: New VoiceManager object with filtered audio
+    """
+    sample_rate = voice_manager.rate
+    data = voice_manager.float_data()
+
+    if method == "fir":
+        filtered = FILTER.fir_filter(data, FILTER.design_fir(sample_rate, low_freq, high_freq))
+    elif method == "iir":
+        filtered = signal.sosfilt(FILTER.design_iir(sample_rate, low_freq, high_freq), data, axis=-1)
+    elif method == "fft":
+        filtered = FILTER.fft_filter(data, sample_rate, low_freq, high_freq)
     else:
-        right_channel = None
+        raise ValueError(f"Unknown filter method: {method}")
 
-    voice_manager = VoiceManager(left_channel=left_channel, right_channel=right_channel, sample_rate=sample_rate)
-    left_channel_FFT, right_channel_FFT = FFT(voice_manager)
-
-    return VoiceManager(left_channel=left_channel, right_channel=right_channel, sample_rate=sample_rate)
+    return voice_manager.with_float_data(filtered)
 
 def add_tail(voice_manager: VoiceManager, tail_time: float) -> VoiceManager:
     """
     Add tail to the voice
     """
     sample_rate = voice_manager.rate
-    left_channel, right_channel = voice_manager.get_audio_array()
 
     tail_length = int(tail_time * sample_rate)
-    tail = np.zeros(tail_length).astype(np.int16)
-    left_channel = np.concatenate([left_channel, tail])
-    if right_channel is not None:
-        right_channel = np.concatenate([right_channel, tail])
+    data = np.pad(voice_manager.channel_data, ((0, 0), (0, tail_length)))
 
-    return VoiceManager(left_channel=left_channel, right_channel=right_channel, sample_rate=sample_rate)
+    return VoiceManager(channel_data=data, sample_rate=sample_rate)
 
 def add_head(voice_manager: VoiceManager, head_time: float) -> VoiceManager:
     """
     Add head to the voice
     """
     sample_rate = voice_manager.rate
-    left_channel, right_channel = voice_manager.get_audio_array()
 
     head_length = int(head_time * sample_rate)
-    head = np.zeros(head_length).astype(np.int16)
-    left_channel = np.concatenate([head, left_channel])
-    if right_channel is not None:
-        right_channel = np.concatenate([head, right_channel])
+    data = np.pad(voice_manager.channel_data, ((0, 0), (head_length, 0)))
+
+    return VoiceManager(channel_data=data, sample_rate=sample_rate)
 
-    return VoiceManager(left_channel=left_channel, right_channel=right_channel, sample_rate=sample_rate)
 
 
+class StretchStream:
+    """
+    Streaming phase-vocoder time stretch
+
+    Blocks of shape (channels, frames) go in, stretched blocks come out as soon as they
+    are final. The analysis frames, interpolated magnitudes, accumulated phase and
+    window-normalised overlap-add are the same as librosa's stft -> phase_vocoder -> istft,
+    but only about two analysis frames and one synthesis frame are kept in memory.
+    """
 
-def stretch(voice_manager: VoiceManager, target_duration: float) -> VoiceManager:
+    def __init__(self, rate: float, channels: int, n_fft: int = 2048, hop_length: Union[int, None] = None):
+        if rate <= 0:
+            raise ValueError(f"Stretch rate ({rate}) must be positive")
+
+        self.rate = rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length if hop_length is not None else n_fft // 4
+        self.window = signal.get_window("hann", n_fft).astype(np.float32)
+        self._window_square = self.window ** 2
+        self._phi_advance = self.hop_length * np.linspace(0, np.pi, n_fft // 2 + 1)
+
+        # analysis side, the input is centred like librosa.stft(center=True)
+        self._input = np.zeros((channels, n_fft // 2), dtype=np.float32)
+        self._input_offset = 0  # padded-input index of self._input[:, 0]
+        self._input_frames = 0
+        self._n_analysis_frames = None  # known once the input is finished
+        self._spectra = {}
+        self._step = 0  # synthesis frame index, its analysis position is step * rate
+        self._phase = None
+
+        # synthesis side
+        self._ola = np.zeros((channels, n_fft), dtype=np.float32)
+        self._ola_norm = np.zeros(n_fft, dtype=np.float32)
+        self._skip = n_fft // 2
+        self._emitted = 0
+
+    def _spectrum(self, k: int) -> np.ndarray:
+        if self._n_analysis_frames is not None and k >= self._n_analysis_frames:
+            return np.zeros((self._input.shape[0], self.n_fft // 2 + 1), dtype=np.complex64)
+        if k not in self._spectra:
+            start = k * self.hop_length - self._input_offset
+            frame = self._input[:, start:start + self.n_fft] * self.window
+            self._spectra = {j: v for j, v in self._spectra.items() if j >= k - 1}
+            self._spectra[k] = np.fft.rfft(frame, axis=-1)
+        return self._spectra[k]
+
+    def _frame_available(self, k: int) -> bool:
+        if self._n_analysis_frames is not None:
+            return True
+        return k * self.hop_length + self.n_fft <= self._input_offset + self._input.shape[1]
+
+    def _emit(self, samples: np.ndarray) -> Union[np.ndarray, None]:
+        # drop the centring padding at the start, stop at the target length
+        if self._skip > 0:
+            dropped = min(self._skip, samples.shape[1])
+            samples = samples[:, dropped:]
+            self._skip -= dropped
+        if self._n_analysis_frames is not None:
+            samples = samples[:, :max(0, self.target_frames - self._emitted)]
+        self._emitted += samples.shape[1]
+        return samples if samples.shape[1] > 0 else None
+
+    @property
+    def target_frames(self) -> int:
+        return int(round(self._input_frames / self.rate))
+
+    def _synthesize(self):
+        output = []
+        while True:
+            time = self._step * self.rate
+            k = int(time)
+            if self._n_analysis_frames is not None:
+                if time >= self._n_analysis_frames:
+                    break
+            elif not self._frame_available(k + 1):
+                break
+
+            spectrum_0, spectrum_1 = self._spectrum(k), self._spectrum(k + 1)
+            if self._phase is None:
+                self._phase = np.angle(spectrum_0)
+
+            alpha = time - k
+            magnitude = (1.0 - alpha) * np.abs(spectrum_0) + alpha * np.abs(spectrum_1)
+            frame = np.fft.irfft(magnitude * np.exp(1j * self._phase), n=self.n_fft, axis=-1)
+
+            self._ola += frame * self.window
+            self._ola_norm += self._window_square
+            hop = self.hop_length
+            norm = np.where(self._ola_norm[:hop] > np.finfo(np.float32).tiny, self._ola_norm[:hop], 1.0)
+            # copy, the overlap-add buffer is shifted in place below
+            samples = self._emit(self._ola[:, :hop] / norm)
+            if samples is not None:
+                output.append(samples)
+            self._ola[:, :-hop] = self._ola[:, hop:]
+            self._ola[:, -hop:] = 0
+            self._ola_norm[:-hop] = self._ola_norm[hop:]
+            self._ola_norm[-hop:] = 0
+
+            d_phase = np.angle(spectrum_1) - np.angle(spectrum_0) - self._phi_advance
+            d_phase -= 2.0 * np.pi * np.round(d_phase / (2.0 * np.pi))
+            # keep the accumulated phase wrapped so precision does not degrade on long streams
+            self._phase = self._phase + self._phi_advance + d_phase
+            self._phase -= 2.0 * np.pi * np.round(self._phase / (2.0 * np.pi))
+            self._step += 1
+
+            # input before the next analysis frame is no longer needed
+            consumed = int(self._step * self.rate) * self.hop_length - self._input_offset
+            if self._n_analysis_frames is None and consumed > 0:
+                consumed = min(consumed, self._input.shape[1])
+                self._input = self._input[:, consumed:]
+                self._input_offset += consumed
+
+        return np.concatenate(output, axis=1) if output else np.zeros((self._ola.shape[0], 0), dtype=np.float32)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Feed a (channels, frames) block, returns the stretched samples that are final so far
+        """
+        self._input = np.concatenate([self._input, block.astype(np.float32)], axis=1)
+        self._input_frames += block.shape[1]
+        return self._synthesize()
+
+    def flush(self) -> np.ndarray:
+        """
+        Finish the stream and return the remaining stretched samples
+        """
+        self._n_analysis_frames = 1 + self._input_frames // self.hop_length
+        self._input = np.concatenate(
+            [self._input, np.zeros((self._input.shape[0], self.n_fft // 2), dtype=np.float32)], axis=1)
+
+        output = [self._synthesize()]
+
+        # the tail of the last synthesis frame, then zero padding up to the target length
+        norm = np.where(self._ola_norm > np.finfo(np.float32).tiny, self._ola_norm, 1.0)
+        tail = self._emit(self._ola / norm)
+        if tail is not None:
+            output.append(tail)
+        missing = self.target_frames - self._emitted
+        if missing > 0:
+            output.append(np.zeros((self._ola.shape[0], missing), dtype=np.float32))
+            self._emitted += missing
+
+        return np.concatenate(output, axis=1)
+
+
+def stretch_blocks(blocks, rate: float, channels: int, n_fft: int = 2048):
+    """
+    Time stretch an iterator of (channels, frames) float blocks, yielding output blocks
+    as they are produced. rate > 1 speeds up, rate < 1 slows down.
+    """
+    stream = StretchStream(rate, channels, n_fft=n_fft)
+    for block in blocks:
+        output = stream.process(block)
+        if output.shape[1] > 0:
+            yield output
+    output = stream.flush()
+    if output.shape[1] > 0:
+        yield output
+
+
+def wsola(data: np.ndarray, rate: float, frame_length: int = 1024, tolerance: Union[int, None] = None) -> np.ndarray:
+    """
+    WSOLA (waveform similarity overlap-add) time stretch of a (channels, frames) float array
+
+    Output frames are laid out every frame_length // 2 samples. Each input frame is taken
+    near its nominal position, shifted by up to `tolerance` samples to best line up with the
+    natural continuation of the previous frame. Cheaper than a phase vocoder and free of
+    phasiness on transients, at the cost of some smearing on dense harmonic material.
+    rate > 1 speeds up, rate < 1 slows down.
+    """
+    if rate <= 0:
+        raise ValueError(f"Stretch rate ({rate}) must be positive")
+
+    channels, n = data.shape
+    hop_out = frame_length // 2
+    hop_in = hop_out * rate
+    if tolerance is None:
+        tolerance = frame_length // 4
+
+    out_length = int(round(n / rate))
+    n_frames = int(np.ceil(out_length / hop_out)) + 1
+    window = signal.get_window("hann", frame_length)
+
+    # pad so every candidate frame can be read without bounds checks
+    head = tolerance + frame_length
+    tail = 2 * frame_length + tolerance + int(np.ceil(hop_in)) + hop_out
+    padded = np.pad(data, ((0, 0), (head, tail)))
+    mono = padded.sum(axis=0)
+
+    output = np.zeros((channels, n_frames * hop_out + frame_length))
+    norm = np.zeros(output.shape[1])
+    previous = 0
+
+    for m in range(n_frames):
+        nominal = int(round(m * hop_in))
+        if m == 0:
+            position = nominal
+        else:
+            natural = head + previous + hop_out
+            template = mono[natural:natural + frame_length]
+            lowest = head + nominal - tolerance
+            region = mono[lowest:lowest + frame_length + 2 * tolerance]
+            similarity = np.correlate(region, template, mode="valid")
+            position = nominal - tolerance + int(np.argmax(similarity))
+            position = min(max(position, -frame_length), n + frame_length)
+
+        start = m * hop_out
+        output[:, start:start + frame_length] += padded[:, head + position:head + position + frame_length] * window
+        norm[start:start + frame_length] += window
+        previous = position
+
+    output /= np.where(norm > 1e-8, norm, 1.0)
+    return output[:, :out_length]
+
+
+def _float_blocks(voice_manager: VoiceManager, block_size: int):
+    """
+    Yield the voice as (channels, block_size) float32 blocks in [-1, 1], converting one
+    block at a time instead of the whole clip
+    """
+    data = voice_manager.channel_data
+    for start in range(0, voice_manager.frames, block_size):
+        block = data[:, start:start + block_size]
+        if voice_manager.is_float:
+            yield block.astype(np.float32, copy=False)
+        else:
+            yield block.astype(np.float32) * np.float32(1.0 / 32768.0)
+
+
+def stretch_iter(voice_manager: VoiceManager, target_duration: float, block_size: int = 65536):
+    """
+    Phase vocoder time stretch to target duration, yielding (channels, frames) float32 blocks
+    as they are produced. Only one input block is converted to float at a time and nothing
+    is kept after a block is yielded, so memory stays constant for any clip length, e.g.
+
+        WavWriter("slow.wav", voice.channels, voice.rate).write_blocks(stretch_iter(voice, 60.0))
+    """
+    if target_duration <= 0:
+        raise ValueError(f"Target duration ({target_duration}) must be positive")
+    speed_factor = voice_manager.duration / target_duration
+    return stretch_blocks(_float_blocks(voice_manager, block_size), speed_factor, voice_manager.channels)
+
+
+def stretch(voice_manager: VoiceManager, target_duration: float, block_size: Union[int, None] = None,
+            method: str = "phase_vocoder") -> VoiceManager:
     """
     Slow down the audio to target duration (time stretch without pitch change)
 
     Args:
         voice_manager: VoiceManager object containing audio data
         target_duration: Target duration in seconds (must be greater than original duration)
+        block_size: If given, stretch block by block with StretchStream (see stretch_iter):
+                    no full-length float copy of the input is made and each output block is
+                    written straight into the result; otherwise stretch the whole clip at once
+        method: "phase_vocoder" (default, high quality) or "wsola" (cheaper, good on transients)
 
     Returns:
         VoiceManager: New VoiceManager object with slowed down audio
     """
     original_duration = voice_manager.duration
-    sample_rate = voice_manager.rate
 
     if target_duration <= 0:
         raise ValueError(f"Target duration ({target_duration}) must be positive")
+    if method not in ("phase_vocoder", "wsola"):
+        raise ValueError(f"Unknown stretch method: {method}")
 
     speed_factor = original_duration / target_duration
-    left_channel, right_channel = voice_manager.get_audio_array()
 
-    # Convert int16 to float32 and normalize to [-1.0, 1.0]
-    left_channel_float = left_channel.astype(np.float32) / 32768.0
-    left_channel_stretched = librosa.effects.time_stretch(left_channel_float, rate=speed_factor)
-    # Convert back to int16
-    left_channel_new = (left_channel_stretched * 32768.0).astype(np.int16)
-
-    right_channel_new = None
-    if right_channel is not None:
-        right_channel_float = right_channel.astype(np.float32) / 32768.0
-        right_channel_stretched = librosa.effects.time_stretch(right_channel_float, rate=speed_factor)
-        right_channel_new = (right_channel_stretched * 32768.0).astype(np.int16)
+    if method == "phase_vocoder" and block_size is not None:
+        # the result is the only full-length array: blocks are quantized into it as they come
+        target_frames = int(round(voice_manager.frames / speed_factor))
+        dtype = np.float32 if voice_manager.is_float else np.int16
+        output = np.zeros((voice_manager.channels, target_frames), dtype=dtype)
+        position = 0
+        for block in stretch_iter(voice_manager, target_duration, block_size):
+            block = block[:, :target_frames - position]
+            output[:, position:position + block.shape[1]] = (
+                block if voice_manager.is_float else quantize(block))
+            position += block.shape[1]
+        return VoiceManager(channel_data=output, sample_rate=voice_manager.rate)
+
+    # all channels are stretched in one 2-D pass, in float32 normalized to [-1.0, 1.0]
+    data = voice_manager.float_data()
+
+    if method == "wsola":
+        stretched = wsola(data, speed_factor)
+    else:
+        stretched = librosa.effects.time_stretch(data, rate=speed_factor)
 
-    return VoiceManager(left_channel=left_channel_new, right_channel=right_channel_new, sample_rate=sample_rate)
\ No newline at end of file
+    return voice_manager.with_float_data(stretched)
@@ -0,0 +1,382 @@
+import numpy as np
+import AMP
+import EFX
+import FILTER
+from VoiceManager import VoiceManager
+
+# 相位声码器 / WSOLA 两侧需要的上下文帧数（约两个 2048 点分析帧）
+SPECTRAL_MARGIN = 4096
+# IIR 滤波器冲激响应衰减所需的上下文时长（秒）
+IIR_MARGIN_SECONDS = 0.1
+
+
+class _Op:
+    """
+    效果链中的一个操作
+
+    scale 为输出帧数与输入帧数之比；margin 为把窗口（cut 等）移到本操作之前时
+    两侧额外保留的输入上下文帧数，None 表示窗口不能越过本操作；
+    移动后的输入起点取 align 的整数倍，使输出与原结果逐帧对齐
+    """
+
+    scale = 1.0
+    margin = None
+    align = 1
+
+    def frames(self, frames_in: int) -> int:
+        return frames_in
+
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        raise NotImplementedError
+
+    def key(self) -> tuple:
+        raise NotImplementedError
+
+    def pull(self, window: "_Window", frames_in: int):
+        """
+        把紧跟在本操作之后的窗口移到本操作之前
+
+        Returns:
+            (前置窗口, 操作, 后置窗口或 None)；不值得或不能移动时返回 None
+        """
+        if self.margin is None:
+            return None
+
+        frames_out = self.frames(frames_in)
+        needed_lo = max(window.start, window.lo, 0)
+        needed_hi = min(window.start + window.length, window.hi, frames_out)
+        if needed_lo >= needed_hi:
+            return None
+
+        lo = max(int(np.floor(needed_lo / self.scale)) - self.margin, 0)
+        lo -= lo % self.align
+        hi = min(int(np.ceil(needed_hi / self.scale)) + self.margin, frames_in)
+        # 只有能少处理数据时才移动，同时保证不会来回移动
+        if hi - lo >= frames_in:
+            return None
+
+        shift = int(round(lo * self.scale))
+        pre = _Window(lo, hi - lo, lo, hi)
+        post = _Window(
+            window.start - shift, window.length, window.lo - shift, window.hi - shift
+        )
+        return pre, self.resized(hi - lo), post
+
+    def resized(self, frames_in: int) -> "_Op":
+        """输入长度改变后的等价操作"""
+        return self
+
+
+class _Window(_Op):
+    """
+    cut / add_head / add_tail 合并成的窗口
+
+    输出第 i 帧取输入第 start + i 帧；输入位置在 [lo, hi) 之外的输出为 0
+    """
+
+    def __init__(self, start: int, length: int, lo: int, hi: int):
+        self.start = start
+        self.length = length
+        self.lo = lo
+        self.hi = hi
+
+    def frames(self, frames_in: int) -> int:
+        return self.length
+
+    def then(self, window: "_Window") -> "_Window":
+        """先应用本窗口、再应用 window 的合并窗口"""
+        return _Window(
+            self.start + window.start,
+            window.length,
+            max(self.lo, self.start, window.lo + self.start),
+            min(self.hi, self.start + self.length, window.hi + self.start),
+        )
+
+    def is_identity(self, frames_in: int) -> bool:
+        return (
+            self.start == 0
+            and self.length == frames_in
+            and self.lo <= 0
+            and self.hi >= frames_in
+        )
+
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        data = voice_manager.channel_data
+        end = self.start + self.length
+        lo = max(self.lo, self.start, 0)
+        hi = min(self.hi, end, voice_manager.frames)
+
+        if lo == self.start and hi == end:
+            # 完全落在有效范围内：直接返回视图，不拷贝
+            window = data[:, self.start : end]
+        else:
+            window = np.zeros((len(data), self.length), dtype=data.dtype)
+            if lo < hi:
+                window[:, lo - self.start : hi - self.start] = data[:, lo:hi]
+
+        return VoiceManager(channel_data=window, sample_rate=voice_manager.rate)
+
+    def key(self) -> tuple:
+        return ("window", self.start, self.length, self.lo, self.hi)
+
+
+class _Inverse(_Op):
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        return EFX.inverse(voice_manager)
+
+    def key(self) -> tuple:
+        return ("inverse",)
+
+    def pull(self, window: _Window, frames_in: int):
+        # 倒放前后的窗口一一对应，不需要上下文
+        pre = _Window(
+            frames_in - window.start - window.length,
+            window.length,
+            frames_in - window.hi,
+            frames_in - window.lo,
+        )
+        return pre, self, None
+
+
+class _Filter(_Op):
+    def __init__(self, sample_rate: int, low_freq, high_freq, method: str):
+        self.low_freq = low_freq
+        self.high_freq = high_freq
+        self.method = method
+        if method == "fir":
+            self.margin = len(FILTER.design_fir(sample_rate, low_freq, high_freq))
+        elif method == "iir":
+            self.margin = int(IIR_MARGIN_SECONDS * sample_rate)
+        # fft 是整段砖墙滤波，每个输出都依赖整段输入，窗口不能越过
+
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        return EFX.filter(voice_manager, self.low_freq, self.high_freq, self.method)
+
+    def key(self) -> tuple:
+        return ("filter", self.low_freq, self.high_freq, self.method)
+
+
+class _Stretch(_Op):
+    margin = SPECTRAL_MARGIN
+
+    def __init__(self, sample_rate: int, scale: float, method: str):
+        self.rate = sample_rate
+        self.scale = scale
+        self.method = method
+
+    def frames(self, frames_in: int) -> int:
+        # 与 EFX.stretch 的计算方式一致
+        duration = frames_in / self.rate
+        return int(round(frames_in / (duration / (duration * self.scale))))
+
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        return EFX.stretch(
+            voice_manager, voice_manager.duration * self.scale, method=self.method
+        )
+
+    def key(self) -> tuple:
+        return ("stretch", self.scale, self.method)
+
+
+class _Tune(_Op):
+    margin = SPECTRAL_MARGIN
+
+    def __init__(self, steps: float, bins_per_octave: int, quality: str):
+        self.steps = float(steps)
+        self.bins_per_octave = bins_per_octave
+        self.quality = quality
+        if quality == "low":
+            # 变速重采样：时长按 up / down 缩放，输入起点取 down 的整数倍时多相滤波的相位不变
+            fraction = AMP.varispeed_fraction(self.steps, bins_per_octave)
+            self.scale = float(fraction)
+            self.align = fraction.denominator
+
+    def frames(self, frames_in: int) -> int:
+        return AMP.tuned_frames(
+            frames_in, self.steps, self.bins_per_octave, self.quality
+        )
+
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        return AMP.tune(voice_manager, self.steps, self.bins_per_octave, self.quality)
+
+    def key(self) -> tuple:
+        return ("tune", self.steps, self.bins_per_octave, self.quality)
+
+
+class _PreciseTune(_Op):
+    """
+    调到目标音高；音高在它的实际输入上检测，所以只有作为第一个操作时
+    才能在优化时换算成 _Tune，否则窗口不能越过它
+    """
+
+    def __init__(self, target_pitch: float, bins_per_octave: int, quality: str):
+        self.target_pitch = target_pitch
+        self.bins_per_octave = bins_per_octave
+        self.quality = quality
+
+    def frames(self, frames_in: int) -> int:
+        # 步数未知时无法预知 low 档的时长，其余档位时长不变
+        if self.quality == "low":
+            raise ValueError("precise_tune 的 low 档只能作为效果链的第一个操作")
+        return frames_in
+
+    def resolve(self, voice_manager: VoiceManager) -> _Tune:
+        steps = AMP.steps_to_pitch(
+            voice_manager, self.target_pitch, self.bins_per_octave
+        )
+        return _Tune(steps, self.bins_per_octave, self.quality)
+
+    def apply(self, voice_manager: VoiceManager) -> VoiceManager:
+        return AMP.precise_tune(
+            voice_manager, self.target_pitch, self.bins_per_octave, self.quality
+        )
+
+    def key(self) -> tuple:
+        return ("precise_tune", self.target_pitch, self.bins_per_octave, self.quality)
+
+
+class EffectChain:
+    """
+    延迟求值的效果链
+
+    记录对一个 VoiceManager 的 EFX / AMP 操作，render 时先优化再执行：
+    相邻的 cut / add_head / add_tail 合并成一个窗口（起点、长度、有效范围），
+    窗口被尽量移到 tune / filter / stretch / inverse 之前（两侧保留必要的上下文），
+    昂贵的操作只处理最终真正用到的采样。
+
+    每个方法返回新的 EffectChain，原链不变，可以从同一前缀分出多个变体::
+
+        chain = EffectChain(voice).precise_tune(470).cut(0, 0.8).stretch(1.5)
+        voice_out = chain.render()
+
+    窗口移过 filter（fir / iir）和 low 档 tune 后结果与逐步执行一致；
+    相位声码器和 WSOLA（tune high / medium、stretch）从新的起点开始累积相位、选取帧，
+    结果听感相同但不逐样本相同。需要逐样本一致时用 render(optimize=False)。
+    """
+
+    def __init__(self, voice_manager: VoiceManager, ops: tuple = ()):
+        self.source = voice_manager
+        self.ops = tuple(ops)
+        self.rate = voice_manager.rate
+        self.frames = voice_manager.frames
+        for op in self.ops:
+            self.frames = op.frames(self.frames)
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.rate
+
+    def _then(self, op: _Op) -> "EffectChain":
+        return EffectChain(self.source, self.ops + (op,))
+
+    def _to_frames(self, time: float) -> int:
+        return int(time * self.rate)
+
+    def inverse(self) -> "EffectChain":
+        return self._then(_Inverse())
+
+    def cut(self, start_time: float, end_time: float) -> "EffectChain":
+        """见 EFX.cut，时间相对于链当前的输出"""
+        if start_time < 0 or start_time > self.duration or end_time > self.duration:
+            raise ValueError("Invalid start time or end time")
+        if end_time == -1:
+            end_time = self.duration
+
+        start = self._to_frames(start_time)
+        end = self._to_frames(end_time)
+        return self._then(_Window(start, end - start, 0, self.frames))
+
+    def add_head(self, head_time: float) -> "EffectChain":
+        head = self._to_frames(head_time)
+        return self._then(_Window(-head, self.frames + head, 0, self.frames))
+
+    def add_tail(self, tail_time: float) -> "EffectChain":
+        tail = self._to_frames(tail_time)
+        return self._then(_Window(0, self.frames + tail, 0, self.frames))
+
+    def filter(
+        self, low_freq: float, high_freq: float, method: str = "fir"
+    ) -> "EffectChain":
+        return self._then(_Filter(self.rate, low_freq, high_freq, method))
+
+    def stretch(
+        self, target_duration: float, method: str = "phase_vocoder"
+    ) -> "EffectChain":
+        if target_duration <= 0:
+            raise ValueError(f"Target duration ({target_duration}) must be positive")
+        return self._then(_Stretch(self.rate, target_duration / self.duration, method))
+
+    def tune(
+        self, steps: float, bins_per_octave: int = 12, quality: str = "high"
+    ) -> "EffectChain":
+        if quality not in AMP.QUALITIES:
+            raise ValueError(f"未知的质量档位: {quality}，可选 {AMP.QUALITIES}")
+        return self._then(_Tune(steps, bins_per_octave, quality))
+
+    def precise_tune(
+        self, target_pitch: float, bins_per_octave: int = 12, quality: str = "high"
+    ) -> "EffectChain":
+        if quality not in AMP.QUALITIES:
+            raise ValueError(f"未知的质量档位: {quality}，可选 {AMP.QUALITIES}")
+        op = _PreciseTune(target_pitch, bins_per_octave, quality)
+        if not self.ops:
+            # 第一个操作：音高在源音频上检测，直接换算成固定步数
+            op = op.resolve(self.source)
+        return self._then(op)
+
+    def key(self) -> tuple:
+        """操作序列的描述，可用作缓存键的一部分"""
+        return tuple(op.key() for op in self.ops)
+
+    def optimized_ops(self) -> list:
+        """
+        返回优化后的操作列表：合并相邻窗口、把窗口移到其他操作之前、去掉恒等窗口
+        """
+        ops = list(self.ops)
+        changed = True
+        while changed:
+            changed = False
+            frames = [self.source.frames]
+            for op in ops:
+                frames.append(op.frames(frames[-1]))
+
+            for i in range(1, len(ops)):
+                op, window = ops[i - 1], ops[i]
+                if not isinstance(window, _Window):
+                    continue
+
+                if isinstance(op, _Window):
+                    ops[i - 1 : i + 1] = [op.then(window)]
+                elif window.is_identity(frames[i]):
+                    del ops[i]
+                else:
+                    pulled = op.pull(window, frames[i - 1])
+                    if pulled is None:
+                        continue
+                    pre, new_op, post = pulled
+                    ops[i - 1 : i + 1] = [pre, new_op] + ([post] if post else [])
+                changed = True
+                break
+
+        if (
+            ops
+            and isinstance(ops[0], _Window)
+            and ops[0].is_identity(self.source.frames)
+        ):
+            del ops[0]
+        return ops
+
+    def render(self, optimize: bool = True) -> VoiceManager:
+        """
+        执行效果链
+
+        Args:
+            optimize: 是否先优化操作顺序；False 时与逐个调用 EFX / AMP 完全一致
+
+        Returns:
+            VoiceManager: 处理结果
+        """
+        voice_manager = self.source
+        for op in self.optimized_ops() if optimize else self.ops:
+            voice_manager = op.apply(voice_manager)
+        return voice_manager
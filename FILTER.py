@@ -0,0 +1,206 @@
+import numpy as np
+from scipy import signal
+from typing import Union
+
+
+def _band_edges(
+    sample_rate: int, low_freq: Union[float, None], high_freq: Union[float, None]
+):
+    """
+    规范化截止频率：low_freq <= 0 表示没有低切，high_freq 为 -1 或不低于奈奎斯特频率表示没有高切
+    """
+    nyquist = sample_rate / 2
+    if low_freq is not None and low_freq <= 0:
+        low_freq = None
+    if high_freq is not None and (high_freq == -1 or high_freq >= nyquist):
+        high_freq = None
+    if low_freq is not None and high_freq is not None and low_freq >= high_freq:
+        raise ValueError(
+            f"低截止频率 ({low_freq}Hz) 必须小于高截止频率 ({high_freq}Hz)"
+        )
+    return low_freq, high_freq
+
+
+def design_fir(
+    sample_rate: int,
+    low_freq: Union[float, None] = None,
+    high_freq: Union[float, None] = None,
+    transition_width: Union[float, None] = None,
+    attenuation_db: float = 60.0,
+) -> np.ndarray:
+    """
+    设计线性相位 FIR 滤波器（Kaiser 窗 sinc）
+
+    只给 low_freq 为高通，只给 high_freq 为低通，两者都给为带通。
+
+    Args:
+        sample_rate: 采样率
+        low_freq: 低截止频率（Hz）
+        high_freq: 高截止频率（Hz）
+        transition_width: 过渡带宽度（Hz），默认取最低截止频率的 1/4，限制在 20~1000Hz
+        attenuation_db: 阻带衰减（dB）
+
+    Returns:
+        np.ndarray: 滤波器系数，长度为奇数
+    """
+    low_freq, high_freq = _band_edges(sample_rate, low_freq, high_freq)
+    if low_freq is None and high_freq is None:
+        return np.ones(1)
+
+    if transition_width is None:
+        lowest_edge = min(f for f in (low_freq, high_freq) if f is not None)
+        transition_width = float(np.clip(lowest_edge / 4, 20, 1000))
+
+    num_taps, beta = signal.kaiserord(
+        attenuation_db, transition_width / (sample_rate / 2)
+    )
+    num_taps |= 1  # 高通/带通需要奇数长度
+
+    if low_freq is not None and high_freq is not None:
+        cutoff, pass_zero = [low_freq, high_freq], False
+    elif low_freq is not None:
+        cutoff, pass_zero = low_freq, False
+    else:
+        cutoff, pass_zero = high_freq, True
+
+    return signal.firwin(
+        num_taps, cutoff, window=("kaiser", beta), pass_zero=pass_zero, fs=sample_rate
+    )
+
+
+def design_iir(
+    sample_rate: int,
+    low_freq: Union[float, None] = None,
+    high_freq: Union[float, None] = None,
+    order: int = 4,
+) -> np.ndarray:
+    """
+    设计 Butterworth IIR 滤波器，以二阶节（SOS biquad）形式返回，数值上比 b/a 形式稳定
+
+    Returns:
+        np.ndarray: 形状为 (节数, 6) 的 SOS 系数
+    """
+    low_freq, high_freq = _band_edges(sample_rate, low_freq, high_freq)
+    if low_freq is not None and high_freq is not None:
+        return signal.butter(
+            order, [low_freq, high_freq], "bandpass", fs=sample_rate, output="sos"
+        )
+    if low_freq is not None:
+        return signal.butter(order, low_freq, "highpass", fs=sample_rate, output="sos")
+    if high_freq is not None:
+        return signal.butter(order, high_freq, "lowpass", fs=sample_rate, output="sos")
+    # 直通
+    return np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])
+
+
+def fir_filter(data: np.ndarray, taps: np.ndarray) -> np.ndarray:
+    """
+    离线 FIR 滤波：沿最后一维做重叠相加（overlap-add）分块卷积，耗时随长度线性增长
+
+    补偿线性相位 FIR 的 (N-1)/2 群延迟，输出与输入等长且对齐
+
+    Args:
+        data: (声道数, 帧数) 或 (帧数,) 的浮点数组
+        taps: FIR 系数
+    """
+    taps = taps.reshape((1,) * (data.ndim - 1) + (-1,))
+    filtered = signal.oaconvolve(data, taps, mode="full", axes=-1)
+    delay = (taps.shape[-1] - 1) // 2
+    return filtered[..., delay : delay + data.shape[-1]]
+
+
+def fft_filter(
+    data: np.ndarray,
+    sample_rate: int,
+    low_freq: Union[float, None] = None,
+    high_freq: Union[float, None] = None,
+) -> np.ndarray:
+    """
+    整段实数 FFT（rfft/irfft）砖墙滤波，按 Hz 指定通带，沿最后一维处理
+    """
+    low_freq, high_freq = _band_edges(sample_rate, low_freq, high_freq)
+    n = data.shape[-1]
+    spectrum = np.fft.rfft(data, axis=-1)
+    freqs = np.fft.rfftfreq(n, d=1 / sample_rate)
+
+    mask = np.ones(len(freqs), dtype=bool)
+    if low_freq is not None:
+        mask &= freqs >= low_freq
+    if high_freq is not None:
+        mask &= freqs <= high_freq
+    spectrum[..., ~mask] = 0
+
+    return np.fft.irfft(spectrum, n=n, axis=-1)
+
+
+class FIRStream:
+    """
+    流式 FIR 滤波器：重叠保留（overlap-save）分块卷积，使用 rfft/irfft
+
+    每次 process 输入 (声道数, 帧数) 的块，输出等长的块；输出是因果的，
+    相对输入有 (N-1)/2 帧群延迟。内存只与滤波器长度有关。
+    """
+
+    def __init__(self, taps: np.ndarray, channels: int):
+        self.taps = taps
+        self.delay = (len(taps) - 1) // 2
+        self._fft_size = 1 << int(np.ceil(np.log2(2 * len(taps))))
+        self._step = self._fft_size - len(taps) + 1
+        self._taps_fft = np.fft.rfft(taps, n=self._fft_size)
+        self._history = np.zeros((channels, len(taps) - 1))
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        n_taps = len(self.taps)
+        buffer = np.concatenate([self._history, block], axis=1)
+        output = np.empty(block.shape, dtype=np.float64)
+
+        for start in range(0, block.shape[1], self._step):
+            n = min(self._step, block.shape[1] - start)
+            segment = buffer[:, start : start + n + n_taps - 1]
+            convolved = np.fft.irfft(
+                np.fft.rfft(segment, n=self._fft_size, axis=-1) * self._taps_fft,
+                n=self._fft_size,
+                axis=-1,
+            )
+            # 丢弃前 N-1 个受循环卷积混叠影响的采样
+            output[:, start : start + n] = convolved[:, n_taps - 1 : n_taps - 1 + n]
+
+        self._history = buffer[:, buffer.shape[1] - (n_taps - 1) :]
+        return output
+
+
+class IIRStream:
+    """流式 IIR 滤波器：逐块调用 sosfilt 并在块之间保存滤波器状态"""
+
+    def __init__(self, sos: np.ndarray, channels: int):
+        self.sos = sos
+        self._zi = np.zeros((sos.shape[0], channels, 2))
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        output, self._zi = signal.sosfilt(self.sos, block, axis=-1, zi=self._zi)
+        return output
+
+
+def filter_blocks(
+    blocks,
+    sample_rate: int,
+    channels: int,
+    low_freq: Union[float, None] = None,
+    high_freq: Union[float, None] = None,
+    method: str = "fir",
+):
+    """
+    对 (声道数, 帧数) 块的迭代器逐块滤波，产出等长的 float64 块
+
+    Args:
+        method: "fir"（线性相位，有 (N-1)/2 帧延迟）或 "iir"（Butterworth SOS）
+    """
+    if method == "fir":
+        stream = FIRStream(design_fir(sample_rate, low_freq, high_freq), channels)
+    elif method == "iir":
+        stream = IIRStream(design_iir(sample_rate, low_freq, high_freq), channels)
+    else:
+        raise ValueError(f"流式滤波不支持的方法: {method}")
+
+    for block in blocks:
+        yield stream.process(np.asarray(block, dtype=np.float64))
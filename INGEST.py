@@ -0,0 +1,271 @@
+"""
+压缩音频（m4a / mp3 / flac / ogg 等）批量导入
+
+并行解码源目录中的音频，重采样到目标采样率、统一声道数，写成 16 位 PCM WAV
+（或 float32 .npy）缓存，并在输出目录中维护 manifest.json。
+再次运行时只重新解码新增或改动过的源文件（按大小 / 修改时间判断，时间变了再比较内容哈希），
+源文件被删除时对应的输出也会删除。
+
+用法:
+    python INGEST.py assets/raw_m4a assets/ingested --rate 48000 --channels 2
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import librosa
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+from VoiceManager import VoiceManager
+from WavWriter import write_wav
+
+try:
+    import torchaudio
+except ImportError:  # 没有 torchaudio 时用 librosa（audioread / ffmpeg）解码
+    torchaudio = None
+
+MANIFEST_NAME = "manifest.json"
+EXTENSIONS = (".m4a", ".mp3", ".aac", ".flac", ".ogg", ".opus", ".wav")
+
+
+def file_hash(path: str) -> str:
+    """文件内容的 sha1"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def decode(path: str) -> tuple:
+    """
+    解码一个音频文件
+
+    Returns:
+        (np.ndarray, int): (声道数, 帧数) 的 float32 数组（[-1, 1]）和原始采样率
+    """
+    if torchaudio is not None:
+        try:
+            waveform, sample_rate = torchaudio.load(path)
+            return waveform.numpy(), sample_rate
+        except Exception:
+            # 新版 torchaudio 解码依赖 torchcodec，没有安装时在调用时才报错；
+            # 其它无法解码的情况也交给 librosa 再试一次
+            pass
+    data, sample_rate = librosa.load(path, sr=None, mono=False)
+    return np.atleast_2d(data), sample_rate
+
+
+def normalize_channels(data: np.ndarray, channels: int) -> np.ndarray:
+    """
+    统一声道数：单声道复制到各声道，多声道转单声道时取平均，其余情况取前几个声道
+    """
+    if len(data) == channels:
+        return data
+    if channels == 1:
+        return data.mean(axis=0, keepdims=True)
+    if len(data) == 1:
+        return np.repeat(data, channels, axis=0)
+    if len(data) > channels:
+        return data[:channels]
+    raise ValueError(f"无法把 {len(data)} 声道转换为 {channels} 声道")
+
+
+def _decode_to_file(job: tuple) -> dict:
+    source_path, output_path, sample_rate, channels, output_format = job
+    data, source_rate = decode(source_path)
+    if source_rate != sample_rate:
+        data = librosa.resample(
+            data, orig_sr=source_rate, target_sr=sample_rate, res_type="soxr_hq"
+        )
+    data = normalize_channels(data.astype(np.float32, copy=False), channels)
+
+    # 先写临时文件再替换，中断时不会留下半个输出
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        if output_format == "npy":
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(data))
+        else:
+            write_wav(tmp_path, data, len(data), sample_rate)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {"source_rate": int(source_rate), "frames": int(data.shape[1])}
+
+
+def _ingest_one(job: tuple) -> dict:
+    """
+    解码、重采样、统一声道后写入输出文件（在 worker 进程中运行）
+
+    单个文件失败时不抛出，返回 {"error": 错误信息}，不影响其它文件和 manifest 的保存
+    """
+    try:
+        return _decode_to_file(job)
+    except Exception as exc:
+        return {"error": f"{type(exc).__name__}: {exc}"}
+
+
+def load_manifest(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"config": None, "files": {}}
+
+
+def _save_manifest(output_dir: str, manifest: dict):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def ingest(
+    source_dir: str,
+    output_dir: str,
+    sample_rate: int = 48000,
+    channels: int = 2,
+    output_format: str = "wav",
+    max_workers: Union[int, None] = None,
+    extensions: tuple = EXTENSIONS,
+) -> dict:
+    """
+    增量导入 source_dir 中的音频
+
+    Args:
+        source_dir: 源目录
+        output_dir: 输出目录，同时存放 manifest.json
+        sample_rate: 目标采样率
+        channels: 目标声道数
+        output_format: "wav"（16 位 PCM，可直接用 VoiceManager 读取）或 "npy"（float32）
+        max_workers: 解码进程数，默认取 CPU 核数
+        extensions: 要导入的文件扩展名
+
+    Returns:
+        dict: 更新后的 manifest，files 中每项记录源文件的大小、修改时间、哈希和输出文件名
+    """
+    if output_format not in ("wav", "npy"):
+        raise ValueError(f"不支持的输出格式: {output_format}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    config = {"rate": sample_rate, "channels": channels, "format": output_format}
+    manifest = load_manifest(output_dir)
+    previous = manifest["files"] if manifest["config"] == config else {}
+    files = {}
+    jobs = []
+
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.lower().endswith(extensions):
+            continue
+        source_path = os.path.join(source_dir, filename)
+        stat = os.stat(source_path)
+        # 保留源扩展名，take.m4a 和 take.mp3 不会写到同一个输出文件
+        output_name = f"{filename}.{output_format}"
+        entry = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "output": output_name,
+        }
+
+        old = previous.get(filename)
+        output_exists = os.path.exists(os.path.join(output_dir, output_name))
+        if old is not None and output_exists and old["size"] == stat.st_size:
+            if old["mtime"] == stat.st_mtime:
+                files[filename] = old
+                continue
+            # 修改时间变了但内容可能没变（例如重新拷贝），比较哈希
+            entry["sha1"] = file_hash(source_path)
+            if entry["sha1"] == old.get("sha1"):
+                files[filename] = dict(old, mtime=stat.st_mtime)
+                continue
+
+        entry.setdefault("sha1", file_hash(source_path))
+        files[filename] = entry
+        jobs.append(
+            (
+                filename,
+                (
+                    source_path,
+                    os.path.join(output_dir, output_name),
+                    sample_rate,
+                    channels,
+                    output_format,
+                ),
+            )
+        )
+
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+    if max_workers <= 1:
+        results = [_ingest_one(job) for _, job in jobs]
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_ingest_one, [job for _, job in jobs]))
+    else:
+        results = []
+
+    failures = {}
+    for (filename, _), result in zip(jobs, results):
+        if "error" in result:
+            # 失败的文件不写入 manifest，下次运行会重新尝试
+            failures[filename] = result["error"]
+            del files[filename]
+            continue
+        files[filename].update(result)
+        print(f"已导入: {filename} -> {files[filename]['output']}")
+
+    # 删除不再对应任何源文件的旧输出：源文件已删除、导入失败，
+    # 或者配置（采样率 / 声道数 / 格式）变了之后按旧配置写的文件
+    outputs = {entry["output"] for entry in files.values()}
+    for old in manifest["files"].values():
+        stale = os.path.join(output_dir, old["output"])
+        if old["output"] not in outputs and os.path.exists(stale):
+            os.remove(stale)
+
+    manifest = {"config": config, "files": files}
+    _save_manifest(output_dir, manifest)
+    print(f"共 {len(files)} 个文件，重新解码 {len(jobs) - len(failures)} 个")
+    for filename, error in failures.items():
+        print(f"导入失败: {filename}: {error}")
+    return manifest
+
+
+def load(output_dir: str, source_name: str) -> VoiceManager:
+    """
+    读取已导入的音频；npy 输出以内存映射方式加载
+    """
+    manifest = load_manifest(output_dir)
+    entry = manifest["files"][source_name]
+    path = os.path.join(output_dir, entry["output"])
+    if manifest["config"]["format"] == "npy":
+        return VoiceManager(
+            name=source_name,
+            channel_data=np.load(path, mmap_mode="r"),
+            sample_rate=manifest["config"]["rate"],
+        )
+    return VoiceManager(name=source_name, wave_filename=path, mmap=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("source_dir", help="源目录")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("--rate", type=int, default=48000, help="目标采样率")
+    parser.add_argument("--channels", type=int, default=2, help="目标声道数")
+    parser.add_argument("--format", default="wav", choices=["wav", "npy"])
+    parser.add_argument("--workers", type=int, default=None, help="解码进程数")
+    args = parser.parse_args()
+
+    ingest(
+        args.source_dir,
+        args.output_dir,
+        sample_rate=args.rate,
+        channels=args.channels,
+        output_format=args.format,
+        max_workers=args.workers,
+    )
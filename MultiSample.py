@@ -0,0 +1,261 @@
+import bisect
+import threading
+import numpy as np
+import librosa
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Union
+import AMP
+from VoiceManager import VoiceManager
+
+
+class MultiSample:
+    """
+    同一采样在多个音高上的变调结果表
+
+    目标音高按 resolution 音分量化成整数键，每个键只做一次完整变调（AMP.tune），
+    结果统一裁剪 / 补零到源采样的长度（low 档的变速重采样会改变长度），
+    按最近使用顺序保存，总字节数超过 max_bytes 时淘汰最久未用的条目。
+
+    请求的音高还没有时：若表中有相差不超过 max_resample_cents 音分的条目，
+    先用它做一次便宜的变速重采样（AMP.tune 的 low 档）立即返回近似结果，
+    同时在后台线程池中计算精确的条目；否则同步计算。
+    后台积压的键成批交给 AMP.tune_many，共用一次分析。
+
+    用法::
+
+        multisample = MultiSample(voice_5, resolution=5)
+        multisample.prefetch([440 + d for d in range(-100, 101, 20)])
+        voice = multisample.get(447)
+    """
+
+    def __init__(
+        self,
+        voice_manager: VoiceManager,
+        resolution: float = 1.0,
+        max_bytes: int = 256 * 2**20,
+        quality: str = "high",
+        max_resample_cents: float = 50.0,
+        max_workers: int = 2,
+        source_pitch: Union[float, None] = None,
+    ):
+        """
+        Args:
+            voice_manager: 采样
+            resolution: 键的量化精度（音分）
+            max_bytes: 表的内存预算（字节）
+            quality: 完整变调的质量档位，见 AMP.tune
+            max_resample_cents: 用近邻条目重采样代替完整变调的最大音分差，0 表示总是精确计算
+            max_workers: 后台填充的线程数
+            source_pitch: 采样本身的音高（Hz），默认由 AMP.get_pitch 检测
+        """
+        if quality not in AMP.QUALITIES:
+            raise ValueError(f"未知的质量档位: {quality}，可选 {AMP.QUALITIES}")
+        if resolution <= 0:
+            raise ValueError(f"量化精度必须大于0: {resolution}")
+        if source_pitch is None:
+            source_pitch = AMP.get_pitch(voice_manager)
+            if source_pitch <= 0:
+                raise ValueError("无法检测采样的音高，请指定 source_pitch")
+
+        self.voice_manager = voice_manager
+        self.resolution = resolution
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.max_resample_cents = max_resample_cents
+        self.source_pitch = float(source_pitch)
+
+        self._entries = OrderedDict()  # 键 -> VoiceManager，按最近使用排序
+        self._keys = []  # 已有的键，保持有序，用于查找近邻
+        self._pending = {}  # 正在后台计算的键 -> Future
+        self._queue = []  # 等待后台计算的键
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="MultiSample"
+        )
+
+        self.hits = 0
+        self.approximations = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, target_pitch: float) -> int:
+        """目标音高（Hz）对应的量化键"""
+        if target_pitch <= 0:
+            raise ValueError(f"目标音高无效（{target_pitch} Hz），必须大于0")
+        cents = 1200 * np.log2(target_pitch / self.source_pitch)
+        return int(round(cents / self.resolution))
+
+    def _steps(self, key: int) -> float:
+        return key * self.resolution / 100
+
+    def _fit(self, voice: VoiceManager) -> VoiceManager:
+        """裁剪 / 补零到源采样的长度（low 档的变速重采样会改变长度）"""
+        if voice.frames == self.voice_manager.frames:
+            return voice
+        data = librosa.util.fix_length(
+            voice.float_data(), size=self.voice_manager.frames
+        )
+        return voice.with_float_data(data)
+
+    def _store(self, key: int, voice: VoiceManager) -> VoiceManager:
+        """保存一个条目，返回保存的（已统一长度的）结果"""
+        voice = self._fit(voice)
+        with self._lock:
+            future = self._pending.pop(key, None)
+            if key not in self._entries:
+                self._entries[key] = voice
+                bisect.insort(self._keys, key)
+                self._bytes += voice.channel_data.nbytes
+                # 淘汰最久未用的条目，刚放入的条目总是保留
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    old_key, old_voice = self._entries.popitem(last=False)
+                    self._keys.remove(old_key)
+                    self._bytes -= old_voice.channel_data.nbytes
+                    self.evictions += 1
+        if future is not None and not future.cancelled():
+            future.set_result(voice)
+        return voice
+
+    def _drain(self):
+        """
+        计算队列中所有等待的键（在后台线程中运行）
+
+        一批键交给一次 AMP.tune_many，high 档只做一次 STFT 分析
+        """
+        with self._lock:
+            keys, self._queue = self._queue, []
+        if not keys:
+            return
+        try:
+            voices = AMP.tune_many(
+                self.voice_manager,
+                [self._steps(key) for key in keys],
+                max_workers=1,
+                quality=self.quality,
+            )
+        except BaseException as exc:
+            with self._lock:
+                futures = [self._pending.pop(key, None) for key in keys]
+            for future in futures:
+                if future is not None and not future.cancelled():
+                    future.set_exception(exc)
+            return
+        for key, voice in zip(keys, voices):
+            self._store(key, voice)
+
+    def _schedule(self, key: int) -> Future:
+        """把某个键放进后台队列；已在计算时不重复提交（调用者需持有锁）"""
+        if key not in self._pending:
+            self._pending[key] = Future()
+            self._queue.append(key)
+            self._executor.submit(self._drain)
+        return self._pending[key]
+
+    def _nearest(self, key: int) -> Union[int, None]:
+        """表中离 key 最近且在 max_resample_cents 以内的键（调用者需持有锁）"""
+        index = bisect.bisect_left(self._keys, key)
+        candidates = self._keys[max(0, index - 1) : index + 1]
+        if not candidates:
+            return None
+        nearest = min(candidates, key=lambda k: abs(k - key))
+        if abs(nearest - key) * self.resolution > self.max_resample_cents:
+            return None
+        return nearest
+
+    def _resample(self, voice: VoiceManager, cents: float) -> VoiceManager:
+        """变速重采样 cents 音分，再裁剪 / 补零回原来的长度"""
+        shifted = AMP.tune(voice, cents / 100, quality="low")
+        data = librosa.util.fix_length(shifted.float_data(), size=voice.frames)
+        return voice.with_float_data(data)
+
+    def get(self, target_pitch: float, exact: bool = False) -> VoiceManager:
+        """
+        取目标音高的变调结果
+
+        Args:
+            target_pitch: 目标音高（Hz）
+            exact: 为 True 时不使用近邻重采样，必要时等待精确结果
+
+        Returns:
+            VoiceManager: 与源采样等长的变调结果
+        """
+        key = self.key(target_pitch)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            nearest = None if exact else self._nearest(key)
+            if nearest is None:
+                self.misses += 1
+                future = self._pending.get(key)
+            else:
+                self.approximations += 1
+                self._entries.move_to_end(nearest)
+                source = self._entries[nearest]
+                self._schedule(key)
+
+        if nearest is not None:
+            return self._resample(source, (key - nearest) * self.resolution)
+        if future is not None:
+            return future.result()
+        voice = AMP.tune(self.voice_manager, self._steps(key), quality=self.quality)
+        return self._store(key, voice)
+
+    def prefetch(self, target_pitches: list) -> list:
+        """
+        在后台计算一组目标音高，立即返回
+
+        Returns:
+            list[Future]: 每个尚未缓存的键一个 Future
+        """
+        keys = sorted(set(self.key(pitch) for pitch in target_pitches))
+        with self._lock:
+            return [self._schedule(key) for key in keys if key not in self._entries]
+
+    def wait(self):
+        """等待所有后台计算完成"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result()
+
+    def __contains__(self, target_pitch: float) -> bool:
+        with self._lock:
+            return self.key(target_pitch) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "approximations": self.approximations,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "bytes": self._bytes,
+            }
+
+    def close(self):
+        """停止后台线程池，未开始的计算被取消"""
+        with self._lock:
+            self._queue = []
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from typing import Union
+from EffectChain import EffectChain
+from VoiceManager import VoiceManager
+
+# 缓存格式版本，改变存储格式或效果实现时递增，旧条目自动失效
+CACHE_VERSION = 1
+
+
+def _describe(value) -> str:
+    """把参数转换成稳定的字符串，只接受数字、字符串、None 及其元组/列表"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, np.generic):
+        return repr(value.item())
+    if isinstance(value, (tuple, list)):
+        return "(" + ",".join(_describe(v) for v in value) + ")"
+    raise TypeError(f"无法作为缓存键的参数类型: {type(value).__name__}")
+
+
+class RenderCache:
+    """
+    渲染结果的磁盘缓存，按内容寻址
+
+    键由源音频内容哈希、操作序列及参数组成。结果以 .npy 保存 (声道数, 帧数) 数组，
+    命中时以内存映射方式加载，不需要重新计算也不需要整段读入内存。
+    总大小超过 max_bytes 时按最近访问时间（LRU）淘汰；访问时间记录在文件的 mtime 上，
+    多个进程可以共用同一个缓存目录。
+
+    用法::
+
+        cache = RenderCache("./cache")
+        voice = cache.apply(EFX.stretch, source, 1.5)
+        voice = cache.render(EffectChain(source).precise_tune(440).cut(0, 0.8))
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2**30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(voice_manager: VoiceManager, operations: str) -> str:
+        """
+        缓存键：源内容哈希 + 操作描述的哈希；以源哈希开头，便于按源失效
+        """
+        digest = hashlib.sha1(f"{CACHE_VERSION}:{operations}".encode()).hexdigest()
+        return f"{voice_manager.content_hash()}-{digest}"
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.npy", f"{base}.json"
+
+    def get(self, key: str) -> Union[VoiceManager, None]:
+        """
+        查询缓存，未命中返回 None；命中的结果是只读的内存映射
+        """
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                rate = json.load(f)["rate"]
+            data = np.load(data_path, mmap_mode="r")
+            os.utime(data_path)  # 记录访问时间，供 LRU 淘汰
+        except (OSError, ValueError, KeyError, TypeError):
+            # 元数据缺字段或格式不对时同样当作未命中
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return VoiceManager(channel_data=data, sample_rate=rate)
+
+    def put(self, key: str, voice_manager: VoiceManager, operations: str = ""):
+        """
+        写入缓存，写入后按需淘汰旧条目
+        """
+        data_path, meta_path = self._paths(key)
+        # 先写临时文件再替换，避免并发进程读到半个文件；元数据最后写，作为条目完整的标志
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(data_path + tmp_suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(voice_manager.channel_data))
+        os.replace(data_path + tmp_suffix, data_path)
+
+        with open(meta_path + tmp_suffix, "w") as f:
+            json.dump(
+                {
+                    "rate": voice_manager.rate,
+                    "operations": operations,
+                    "created": time.time(),
+                },
+                f,
+            )
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+        self.evict()
+
+    def apply(self, func, voice_manager: VoiceManager, *args, **kwargs) -> VoiceManager:
+        """
+        带缓存地调用 func(voice_manager, *args, **kwargs)，例如 EFX.stretch、AMP.precise_tune
+
+        除 voice_manager 外的参数只能是数字、字符串、None 及其元组/列表
+        """
+        operations = _describe(
+            (
+                f"{func.__module__}.{func.__qualname__}",
+                args,
+                sorted(kwargs.items()),
+            )
+        )
+        key = self.make_key(voice_manager, operations)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        result = func(voice_manager, *args, **kwargs)
+        self.put(key, result, operations)
+        return result
+
+    def render(self, chain: EffectChain, optimize: bool = True) -> VoiceManager:
+        """
+        带缓存地渲染效果链
+        """
+        operations = _describe(("EffectChain", optimize, chain.key()))
+        key = self.make_key(chain.source, operations)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        result = chain.render(optimize)
+        self.put(key, result, operations)
+        return result
+
+    def _entries(self) -> list:
+        """[(最近访问时间, 字节数, 键)]，按访问时间从旧到新排序"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append(
+                    (stat.st_mtime, stat.st_size, entry.name[: -len(".npy")])
+                )
+        return sorted(entries)
+
+    def _remove(self, key: str):
+        for path in reversed(self._paths(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        删除最久未访问的条目，直到总大小不超过 max_bytes
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def invalidate(self, voice_manager: Union[VoiceManager, None] = None):
+        """
+        删除某个源音频的所有缓存结果；不指定时清空整个缓存
+        """
+        prefix = "" if voice_manager is None else voice_manager.content_hash() + "-"
+        for _, _, key in self._entries():
+            if key.startswith(prefix):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
@@ -0,0 +1,356 @@
+import struct
+import numpy as np
+from typing import Union
+import AMP
+from VoiceManager import VoiceManager
+
+
+def _read_varlen(data: bytes, pos: int) -> tuple:
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+
+def read_midi(filename: str) -> dict:
+    """
+    读取标准 MIDI 文件（格式 0 / 1）中的音符
+
+    按文件中的速度变化把 tick 换算成秒；音色、控制器等其它事件被忽略。
+
+    Returns:
+        dict: 每个音符一项的列数组 "pitch", "time"（秒）, "duration"（秒）,
+        "velocity", "track", "channel"，按开始时间排序
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    if data[:4] != b"MThd":
+        raise ValueError(f"不是 MIDI 文件: {filename}")
+    header_length = int.from_bytes(data[4:8], "big")
+    _, track_count, division = struct.unpack(">HHH", data[8:14])
+    if division & 0x8000:
+        raise ValueError("不支持 SMPTE 时间格式的 MIDI 文件")
+
+    tempo_changes = [(0, 500000)]  # (tick, 每拍微秒数)，默认 120 bpm
+    notes = []  # (开始 tick, 结束 tick, 音高, 力度, 轨道, 通道)
+    pos = 8 + header_length
+    for track in range(track_count):
+        chunk_type = data[pos : pos + 4]
+        end = pos + 8 + int.from_bytes(data[pos + 4 : pos + 8], "big")
+        pos += 8
+        if chunk_type != b"MTrk":
+            pos = end
+            continue
+
+        tick = 0
+        status = None
+        active = {}  # (通道, 音高) -> [(开始 tick, 力度)]，同音高重叠时先开先关
+        while pos < end:
+            delta, pos = _read_varlen(data, pos)
+            tick += delta
+            byte = data[pos]
+            if byte == 0xFF:
+                meta_type = data[pos + 1]
+                length, pos = _read_varlen(data, pos + 2)
+                if meta_type == 0x51:
+                    tempo = int.from_bytes(data[pos : pos + 3], "big")
+                    tempo_changes.append((tick, tempo))
+                pos += length
+                status = None
+                continue
+            if byte in (0xF0, 0xF7):
+                length, pos = _read_varlen(data, pos + 1)
+                pos += length
+                status = None
+                continue
+            if byte & 0x80:
+                status = byte
+                pos += 1
+            elif status is None:
+                raise ValueError(f"MIDI 数据损坏: 第 {track} 轨缺少状态字节")
+
+            kind = status & 0xF0
+            channel = status & 0x0F
+            if kind in (0xC0, 0xD0):
+                pos += 1
+                continue
+            pitch, velocity = data[pos], data[pos + 1]
+            pos += 2
+            if kind == 0x90 and velocity > 0:
+                active.setdefault((channel, pitch), []).append((tick, velocity))
+            elif kind in (0x80, 0x90) and active.get((channel, pitch)):
+                start, start_velocity = active[(channel, pitch)].pop(0)
+                notes.append((start, tick, pitch, start_velocity, track, channel))
+        # 没有关闭的音符持续到轨道结束
+        for (channel, pitch), started in active.items():
+            for start, velocity in started:
+                notes.append((start, tick, pitch, velocity, track, channel))
+        pos = end
+
+    columns = np.array(notes, dtype=np.int64).reshape(-1, 6).T
+    tempo_changes.sort(key=lambda change: change[0])
+    tempo_ticks = np.array([change[0] for change in tempo_changes])
+    seconds_per_tick = np.array([change[1] for change in tempo_changes]) / (
+        1e6 * division
+    )
+    tempo_seconds = np.concatenate(
+        ([0.0], np.cumsum(np.diff(tempo_ticks) * seconds_per_tick[:-1]))
+    )
+
+    def to_seconds(ticks: np.ndarray) -> np.ndarray:
+        index = np.searchsorted(tempo_ticks, ticks, side="right") - 1
+        return (
+            tempo_seconds[index]
+            + (ticks - tempo_ticks[index]) * seconds_per_tick[index]
+        )
+
+    start, end = to_seconds(columns[0]), to_seconds(columns[1])
+    order = np.argsort(start, kind="stable")
+    return {
+        "pitch": columns[2][order],
+        "time": start[order],
+        "duration": (end - start)[order],
+        "velocity": columns[3][order],
+        "track": columns[4][order],
+        "channel": columns[5][order],
+    }
+
+
+def _scatter_add(
+    block: np.ndarray,
+    bank: np.ndarray,
+    source_starts: np.ndarray,
+    target_starts: np.ndarray,
+    counts: np.ndarray,
+    gains: np.ndarray,
+    fade_starts: Union[np.ndarray, None] = None,
+    release_frames: int = 0,
+):
+    """
+    把各段 bank[:, source_starts[i]:][:counts[i]] * gains[i] 累加到 block[:, target_starts[i]:]
+
+    所有段展开成一个索引数组后用一次 np.add.at 完成，段之间可以重叠；
+    fade_starts 给出时第 i 段第 k 帧再乘以 1 - (fade_starts[i] + k) / release_frames
+    """
+    total = int(counts.sum())
+    if total == 0:
+        return
+    # 第 i 段第 k 帧在展开后的下标为 first[i] + k
+    first = np.cumsum(counts) - counts
+    step = np.arange(total)
+    source = np.repeat(source_starts - first, counts) + step
+    target = np.repeat(target_starts - first, counts) + step
+    weights = np.repeat(gains, counts)
+    if fade_starts is not None:
+        weights *= 1 - (np.repeat(fade_starts - first, counts) + step) / release_frames
+    for channel in range(len(block)):
+        np.add.at(block[channel], target, bank[channel, source] * weights)
+
+
+def pitch_to_midi(pitch: float) -> float:
+    """频率（Hz）转换为 MIDI 音高（A4 = 440 Hz = 69），可以是小数"""
+    return 69 + 12 * np.log2(pitch / 440.0)
+
+
+class Sampler:
+    """
+    采样器：用一个采样把音符事件直接渲染成 PCM
+
+    每个用到的音高只变调一次（AMP.tune_many），结果保存在按音高索引的表中，
+    之后的渲染直接复用；混音时把同一块内所有音符的采样位置展开成索引数组，
+    用 np.add.at 一次性累加到块缓冲区，不逐个音符循环。
+
+    音符在 duration 结束后经过 release 秒的线性淡出被截断；采样比音符短时播放完整个采样。
+    one_shot 为 True 时忽略音符长度，总是播放完整个采样。
+
+    用法::
+
+        sampler = Sampler(VoiceManager(wave_filename="./assets/ball.wav"), root_pitch=60)
+        voice = sampler.render(read_midi("pi.mid"))
+        voice = sampler.render(music_generator.gen_events(g, 64), tempo=120)
+    """
+
+    def __init__(
+        self,
+        voice_manager: VoiceManager,
+        root_pitch: Union[float, None] = None,
+        quality: str = "high",
+        release: float = 0.02,
+        one_shot: bool = False,
+        max_workers: Union[int, None] = None,
+    ):
+        """
+        Args:
+            voice_manager: 采样
+            root_pitch: 采样本身的 MIDI 音高，默认由 AMP.get_pitch 检测
+            quality: 变调质量档位，见 AMP.tune
+            release: 音符结束后的淡出时间（秒）
+            one_shot: 是否忽略音符长度
+            max_workers: 变调的进程数，见 AMP.tune_many
+        """
+        if root_pitch is None:
+            detected = AMP.get_pitch(voice_manager)
+            if detected <= 0:
+                raise ValueError("无法检测采样的音高，请指定 root_pitch")
+            root_pitch = pitch_to_midi(detected)
+        if quality not in AMP.QUALITIES:
+            raise ValueError(f"未知的质量档位: {quality}，可选 {AMP.QUALITIES}")
+
+        self.voice_manager = voice_manager
+        self.root_pitch = float(root_pitch)
+        self.quality = quality
+        self.release = release
+        self.one_shot = one_shot
+        self.max_workers = max_workers
+        self.rate = voice_manager.rate
+        self.channels = voice_manager.channels
+        self._table = {}  # MIDI 音高 -> 变调后的 VoiceManager
+
+    @property
+    def table(self) -> dict:
+        """已经生成的 {MIDI 音高: VoiceManager}"""
+        return dict(self._table)
+
+    def prepare(self, pitches) -> dict:
+        """
+        为还没有的音高生成变调采样，每个音高只计算一次
+
+        Returns:
+            dict: pitches 中各音高对应的 VoiceManager
+        """
+        pitches = sorted(set(float(pitch) for pitch in np.atleast_1d(pitches)))
+        missing = [pitch for pitch in pitches if pitch not in self._table]
+        if missing:
+            tuned = AMP.tune_many(
+                self.voice_manager,
+                [pitch - self.root_pitch for pitch in missing],
+                max_workers=self.max_workers,
+                quality=self.quality,
+            )
+            self._table.update(zip(missing, tuned))
+        return {pitch: self._table[pitch] for pitch in pitches}
+
+    def _schedule(self, events: dict, tempo: Union[float, None]) -> tuple:
+        """
+        把事件换算成帧，并把用到的采样拼成一个 (声道数, 总帧数) 的 float32 库
+
+        Returns:
+            (bank, starts, lengths, note_frames, gains, offsets)，除 bank 外都按 starts 排序
+        """
+        pitch = np.asarray(events["pitch"], dtype=np.float64)
+        time = np.asarray(events["time"], dtype=np.float64)
+        duration = np.asarray(events["duration"], dtype=np.float64)
+        velocity = events.get("velocity")
+        if tempo is not None:
+            # 以拍为单位的时间（如 gen_events 的输出）
+            time = time * 60.0 / tempo
+            duration = duration * 60.0 / tempo
+
+        unique_pitches, table_index = np.unique(pitch, return_inverse=True)
+        samples = self.prepare(unique_pitches)
+        data = [samples[float(p)].float_data() for p in unique_pitches]
+        bank = np.concatenate(data, axis=1) if data else np.zeros((self.channels, 0))
+        sample_lengths = np.array([d.shape[1] for d in data], dtype=np.int64)
+        sample_offsets = np.concatenate(([0], np.cumsum(sample_lengths)[:-1]))
+
+        starts = np.round(time * self.rate).astype(np.int64)
+        note_frames = np.round(duration * self.rate).astype(np.int64)
+        release_frames = int(round(self.release * self.rate))
+        lengths = sample_lengths[table_index]
+        if not self.one_shot:
+            lengths = np.minimum(lengths, note_frames + release_frames)
+        gains = (
+            np.ones(len(pitch), dtype=np.float32)
+            if velocity is None
+            else (np.asarray(velocity) / 127.0).astype(np.float32)
+        )
+
+        order = np.argsort(starts, kind="stable")
+        return (
+            bank,
+            starts[order],
+            lengths[order],
+            note_frames[order],
+            gains[order],
+            sample_offsets[table_index][order],
+        )
+
+    def render_blocks(
+        self, events: dict, tempo: Union[float, None] = None, block_frames: int = 65536
+    ):
+        """
+        逐块渲染，生成形状为 (声道数, 帧数) 的 float32 块
+
+        Args:
+            events: 列数组 "pitch"（MIDI 音高）、"time"、"duration"，可选 "velocity"（0-127）
+            tempo: 给出时 time / duration 以拍为单位，否则以秒为单位
+            block_frames: 每块的帧数
+        """
+        bank, starts, lengths, note_frames, gains, offsets = self._schedule(
+            events, tempo
+        )
+        if len(starts) == 0:
+            return
+        ends = starts + lengths
+        max_length = int(lengths.max())
+        total_frames = int(ends.max())
+        release_frames = int(round(self.release * self.rate))
+        fade = not self.one_shot and release_frames > 0
+        # 音符主体（之后是释音淡出段）在音符内部的结束帧
+        body_ends = np.minimum(note_frames, lengths) if fade else lengths
+
+        for block_start in range(0, total_frames, block_frames):
+            block_end = min(block_start + block_frames, total_frames)
+            block = np.zeros((bank.shape[0], block_end - block_start), dtype=np.float32)
+            # 与本块有交集的音符：starts 有序，只需在 (块起点 - 最长音符, 块终点) 内查找
+            lo = np.searchsorted(starts, block_start - max_length, side="right")
+            hi = np.searchsorted(starts, block_end)
+            hit = lo + np.flatnonzero(ends[lo:hi] > block_start)
+            note_start = starts[hit]
+
+            # 本块覆盖的各音符内部帧范围 [window_lo, window_hi)
+            window_lo = np.maximum(block_start - note_start, 0)
+            window_hi = np.minimum(block_end - note_start, lengths[hit])
+            body_end = np.minimum(window_hi, body_ends[hit])
+            _scatter_add(
+                block,
+                bank,
+                offsets[hit] + window_lo,
+                note_start + window_lo - block_start,
+                np.maximum(body_end - window_lo, 0),
+                gains[hit],
+            )
+            if fade:
+                first = np.maximum(window_lo, body_ends[hit])
+                _scatter_add(
+                    block,
+                    bank,
+                    offsets[hit] + first,
+                    note_start + first - block_start,
+                    np.maximum(window_hi - first, 0),
+                    gains[hit],
+                    first - note_frames[hit],
+                    release_frames,
+                )
+            yield block
+
+    def render(
+        self,
+        events: dict,
+        tempo: Union[float, None] = None,
+        name: Union[str, None] = None,
+        block_frames: int = 65536,
+    ) -> VoiceManager:
+        """
+        渲染全部音符为一个 float32 的 VoiceManager，参数见 render_blocks
+        """
+        blocks = list(self.render_blocks(events, tempo, block_frames))
+        data = (
+            np.concatenate(blocks, axis=1)
+            if blocks
+            else np.zeros((self.channels, 0), dtype=np.float32)
+        )
+        return VoiceManager(name=name, channel_data=data, sample_rate=self.rate)
@@ -0,0 +1,130 @@
+import bisect
+import numpy as np
+from typing import Union
+from VoiceManager import VoiceManager
+
+
+class Timeline:
+    """
+    按采样偏移摆放片段的编排结构
+
+    片段只保存对 VoiceManager 的引用，不拷贝采样；渲染时按需从各片段的原始缓冲区读取，
+    重叠的片段相加。同一个片段重复摆放（如循环）不占用额外内存。
+    """
+
+    def __init__(self, sample_rate: Union[int, None] = None):
+        self.rate = sample_rate
+        self._starts = []  # 各片段的起始帧，保持有序
+        self._clips = []  # 与 _starts 对应的 VoiceManager
+        self._max_clip_frames = 0
+        self._end = 0
+
+    def add(self, voice: VoiceManager, offset: int) -> int:
+        """
+        在指定帧偏移处放置一个片段
+
+        Args:
+            voice: 片段
+            offset: 起始帧
+
+        Returns:
+            int: 片段的起始帧
+        """
+        if offset < 0:
+            raise ValueError(f"片段偏移不能为负: {offset}")
+        if self.rate is None:
+            self.rate = voice.rate
+        # 浮点片段在摆放时就量化成 int16 并缓存，渲染（可能在声卡回调中）只读取缓存
+        voice.int16_data
+
+        index = bisect.bisect_right(self._starts, offset)
+        self._starts.insert(index, offset)
+        self._clips.insert(index, voice)
+        self._max_clip_frames = max(self._max_clip_frames, voice.frames)
+        self._end = max(self._end, offset + voice.frames)
+        return offset
+
+    def add_at(self, voice: VoiceManager, time: float) -> int:
+        """在指定时间（秒）处放置一个片段"""
+        rate = self.rate if self.rate is not None else voice.rate
+        return self.add(voice, int(round(time * rate)))
+
+    def append(self, voice: VoiceManager) -> int:
+        """把片段接在当前编排的末尾"""
+        return self.add(voice, self._end)
+
+    @property
+    def clips(self) -> list:
+        """按起始帧排序的 (起始帧, 片段) 列表"""
+        return list(zip(self._starts, self._clips))
+
+    @property
+    def frames(self) -> int:
+        return self._end
+
+    @property
+    def duration(self) -> float:
+        return self._end / self.rate if self.rate else 0.0
+
+    @property
+    def channels(self) -> int:
+        """所有片段中最少的声道数（单声道时只取各片段的第一个声道）"""
+        if not self._clips:
+            return 1
+        return min(voice.channels for voice in self._clips)
+
+    def clips_in_range(self, start: int, frames: int) -> list:
+        """
+        返回与 [start, start + frames) 有交集的 (起始帧, 片段) 列表
+        """
+        first = bisect.bisect_left(self._starts, start - self._max_clip_frames + 1)
+        last = bisect.bisect_left(self._starts, start + frames)
+        return [
+            (offset, voice)
+            for offset, voice in zip(self._starts[first:last], self._clips[first:last])
+            if offset + voice.frames > start
+        ]
+
+    def render_into(self, out: np.ndarray, start: int):
+        """
+        把 [start, start + out.shape[1]) 范围内的片段累加到 out 中
+
+        out 的形状为 (声道数, 帧数)，通常是预先分配好的 int32/float 缓冲区，
+        本函数不会分配与块长度相关的新数组。
+        """
+        channels, frames = out.shape
+        # 与 clips_in_range 相同的查找，但直接按下标遍历，不构造列表
+        first = bisect.bisect_left(self._starts, start - self._max_clip_frames + 1)
+        last = bisect.bisect_left(self._starts, start + frames)
+        for index in range(first, last):
+            offset = self._starts[index]
+            voice = self._clips[index]
+            if offset + voice.frames <= start:
+                continue
+            src_start = max(0, start - offset)
+            src_end = min(voice.frames, start + frames - offset)
+            dst_start = offset + src_start - start
+            dst_end = dst_start + (src_end - src_start)
+
+            source = voice.int16_data[:, src_start:src_end]
+            if source.shape[0] >= channels:
+                out[:, dst_start:dst_end] += source[:channels]
+            else:
+                # 声道数不足的片段（如单声道）在各输出声道上都用第一个声道
+                out[:, dst_start:dst_end] += source[0]
+
+    def render(self, start: int, frames: int) -> np.ndarray:
+        """
+        渲染 [start, start + frames) 范围，返回形状为 (声道数, 帧数) 的 int16 数组
+
+        重叠的片段相加后削波到 int16 范围
+        """
+        frames = max(0, min(frames, self._end - start))
+        mixed = np.zeros((self.channels, frames), dtype=np.int32)
+        self.render_into(mixed, start)
+        return np.clip(mixed, -(2**15), 2**15 - 1).astype(np.int16)
+
+    def to_voice_manager(self, name: str = None) -> VoiceManager:
+        """渲染整条编排为一个 VoiceManager"""
+        data = self.render(0, self._end)
+        return VoiceManager(channel_data=data, sample_rate=self.rate, name=name)
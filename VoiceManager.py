@@ -1,11 +1,52 @@
-import pyaudio
 import wave
+import hashlib
 import matplotlib.pyplot as plt
 import numpy as np
 import threading
+import struct
 from typing import Tuple
 from typing import Union
 
+try:
+    import pyaudio
+except ImportError:  # playback is optional, loading and processing work without it
+    pyaudio = None
+
+
+def find_wav_data_chunk(wave_filename: str) -> Tuple[int, int]:
+    """
+    Walk the RIFF chunks of a WAV file and return (offset, size) of the data chunk
+    """
+    with open(wave_filename, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{wave_filename} is not a RIFF/WAVE file")
+
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{wave_filename} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"data":
+                return f.tell(), chunk_size
+            # chunks are word aligned
+            f.seek(chunk_size + (chunk_size & 1), 1)
+
+
+def quantize(data: np.ndarray, dither: bool = False, rng: Union[np.random.Generator, None] = None) -> np.ndarray:
+    """
+    Convert float samples in [-1, 1] to int16 with rounding and clipping.
+    With dither=True triangular (TPDF) dither of +-1 LSB is added before rounding, which
+    turns the quantization error into a little signal-independent noise.
+    """
+    scaled = np.asarray(data, dtype=np.float32) * np.float32(32768.0)
+    if dither:
+        rng = np.random.default_rng() if rng is None else rng
+        scaled += rng.random(scaled.shape, dtype=np.float32)
+        scaled -= rng.random(scaled.shape, dtype=np.float32)
+    return np.clip(np.round(scaled), -32768, 32767).astype(np.int16)
+
+
 class VoiceManager():
     def __init__(
         self,
@@ -14,7 +55,18 @@ class VoiceManager():
         left_channel: Union[np.array, None] = None,
         right_channel: Union[np.array, None] = None,
         sample_rate: Union[int, None] = None,
+        mmap: bool = False,
+        channel_data: Union[np.ndarray, None] = None,
     ):
+        """
+        Build a voice from a WAV file, from channel arrays or from a (channels, frames) array
+
+        channel_data may hold any number of channels; left_channel / right_channel are
+        views of its first two rows. Float channel data (samples in [-1, 1]) stays float
+        through EFX and AMP and is only quantized to int16 for playback, mixing and saving.
+        With mmap=True the data chunk of the WAV file is memory-mapped instead of read:
+        opening costs the same for any file size and samples are paged in on access.
+        """
         default_sample_rate = 48000  # default sample rate
         self.wf = None
         self.name = name
@@ -28,8 +80,11 @@ class VoiceManager():
         self.sampwidth = None
 
         # what we want to eventually get and use
-        self.audio_data = None
-        self.audio_array = None
+        # audio_data / audio_array are derived from the channels on first access
+        self._audio_data = None
+        self._audio_array = None
+        self._channel_data = None
+        self._int16_data = None
         self.left_channel = None
         self.right_channel = None
 
@@ -40,7 +95,19 @@ class VoiceManager():
         self._is_playing = False
 
         # create voice from wave file
-        if wave_filename is not None and left_channel is None and right_channel is None:
+        if channel_data is not None:
+            if channel_data.ndim != 2:
+                raise ValueError("channel_data must have shape (channels, frames)")
+            self._channel_data = channel_data
+            self.left_channel = channel_data[0]
+            self.right_channel = channel_data[1] if len(channel_data) > 1 else None
+
+            self.rate = sample_rate if sample_rate is not None else default_sample_rate
+            self.channels, self.frames = channel_data.shape
+            self.duration = self.frames / self.rate
+            self.sampwidth = 2 # 统一为 Int16
+
+        elif wave_filename is not None and left_channel is None and right_channel is None:
             self.wf = wave.open(wave_filename, "rb")
 
             if sample_rate is None:
@@ -53,17 +120,38 @@ class VoiceManager():
             self.duration = self.frames / self.rate  # 音频时长（秒）
             self.sampwidth = self.wf.getsampwidth()
 
-            self.audio_data = self.wf.readframes(self.frames)  # 读取所有音频数据
-            self.audio_array = np.frombuffer(
-                self.audio_data, dtype=np.int16
-            )  # 将字节数据转换为numpy数组
+            if mmap:
+                # 只读取文件头，数据区直接映射，不拷贝
+                self.wf.close()
+                self.wf = None
+                if self.sampwidth != 2:
+                    raise ValueError("mmap loading only supports 16-bit PCM")
+
+                data_offset, _ = find_wav_data_chunk(wave_filename)
+                self._audio_array = np.memmap(
+                    wave_filename,
+                    dtype="<i2",
+                    mode="r",
+                    offset=data_offset,
+                    shape=(self.frames * self.channels,),
+                )
+                self._audio_data = memoryview(self._audio_array).cast("B")
+            else:
+                self._audio_data = self.wf.readframes(self.frames)  # 读取所有音频数据
+                self._audio_array = np.frombuffer(
+                    self._audio_data, dtype=np.int16
+                )  # 将字节数据转换为numpy数组
+                # 数据已全部读入，不再占用文件句柄
+                self.wf.close()
+                self.wf = None
 
-            if self.channels == 2:
-                self.audio_array = self.audio_array.reshape(-1, 2)
-                self.left_channel = self.audio_array[:, 0]
-                self.right_channel = self.audio_array[:, 1]
+            if self.channels > 1:
+                self._audio_array = self._audio_array.reshape(-1, self.channels)
+                self._channel_data = self._audio_array.T
+                self.left_channel = self._audio_array[:, 0]
+                self.right_channel = self._audio_array[:, 1]
             else:
-                self.left_channel = self.audio_array
+                self.left_channel = self._audio_array
                 self.right_channel = None
 
         elif left_channel is not None:
@@ -76,15 +164,12 @@ class VoiceManager():
                 self.rate = sample_rate
 
             if right_channel is not None:
-                self.audio_array = np.concatenate([left_channel.reshape(-1, 1), right_channel.reshape(-1, 1)], axis=1)
                 self.channels = 2
             else:
-                self.audio_array = left_channel
                 self.channels = 1
 
-            self.frames = len(self.audio_array)
+            self.frames = len(left_channel)
             self.duration = self.frames / self.rate
-            self.audio_data = self.audio_array.tobytes()
             self.sampwidth = 2 # 统一为 Int16
 
         else:
@@ -92,6 +177,7 @@ class VoiceManager():
         
         self._audio_position = 0
         self._bytes_per_frame = self.sampwidth * self.channels
+        self._content_hash = None
 
 
     def get_audio_array(self) -> Tuple[np.array, Union[np.array, None]]:
@@ -100,16 +186,133 @@ class VoiceManager():
         """
         return self.left_channel, self.right_channel
 
+    @property
+    def channel_data(self) -> np.ndarray:
+        """
+        All channels as one (channels, frames) array, the layout EFX and AMP process in.
+        A view for voices loaded from WAV files or built from channel_data; voices built
+        from separate channel arrays stack them once on first access.
+        """
+        if self._channel_data is None:
+            if self.right_channel is not None:
+                self._channel_data = np.stack((self.left_channel, self.right_channel))
+            else:
+                self._channel_data = self.left_channel[np.newaxis]
+        return self._channel_data
+
+    @property
+    def is_float(self) -> bool:
+        """True when the samples are floats in [-1, 1] rather than int16"""
+        return np.issubdtype(self.left_channel.dtype, np.floating)
+
+    def float_data(self) -> np.ndarray:
+        """
+        (channels, frames) float32 samples in [-1, 1], the format EFX and AMP process in.
+        Float32 voices return their own data without copying.
+        """
+        if self.is_float:
+            return self.channel_data.astype(np.float32, copy=False)
+        data = self.channel_data.astype(np.float32)
+        data *= np.float32(1.0 / 32768.0)
+        return data
+
+    @property
+    def int16_data(self) -> np.ndarray:
+        """
+        (channels, frames) int16 samples used for playback, mixing and saving.
+        Float voices are quantized (rounded and clipped) once and the result is cached.
+        """
+        if not self.is_float:
+            return self.channel_data
+        if self._int16_data is None:
+            self._int16_data = quantize(self.channel_data)
+        return self._int16_data
+
+    def with_float_data(self, data: np.ndarray, sample_rate: Union[int, None] = None) -> "VoiceManager":
+        """
+        Wrap processed float samples in a new voice of the same format as this one:
+        float voices stay float32, int16 voices are quantized.
+        """
+        sample_rate = self.rate if sample_rate is None else sample_rate
+        if self.is_float:
+            return VoiceManager(channel_data=data.astype(np.float32, copy=False), sample_rate=sample_rate)
+        return VoiceManager(channel_data=quantize(data), sample_rate=sample_rate)
+
+    def as_float32(self) -> "VoiceManager":
+        """
+        A float32 copy of this voice. Effects applied to it keep working in float,
+        so a chain of effects pays a single int16 conversion at the end.
+        """
+        if self.is_float and self.left_channel.dtype == np.float32:
+            return self
+        return VoiceManager(name=self.name, channel_data=self.float_data(), sample_rate=self.rate)
+
+    def as_int16(self, dither: bool = False, rng: Union[np.random.Generator, None] = None) -> "VoiceManager":
+        """
+        An int16 version of this voice, optionally with TPDF dither (see quantize)
+        """
+        if not self.is_float:
+            return self
+        data = quantize(self.channel_data, dither, rng) if dither else self.int16_data
+        return VoiceManager(name=self.name, channel_data=data, sample_rate=self.rate)
+
+    @property
+    def audio_array(self) -> np.array:
+        """
+        Interleaved int16 samples, (frames, channels) for multichannel or (frames,) for mono.
+        Voices built from channel arrays only build it when it is first needed.
+        """
+        if self._audio_array is None:
+            if self.is_float:
+                data = self.int16_data
+                self._audio_array = data[0] if self.channels == 1 else data.T
+            elif self.channels == 1:
+                self._audio_array = self.left_channel
+            elif self._channel_data is None:
+                self._audio_array = np.column_stack((self.left_channel, self.right_channel))
+            else:
+                self._audio_array = self._channel_data.T
+        return self._audio_array
+
+    @property
+    def audio_data(self) -> Union[bytes, memoryview]:
+        """
+        Raw PCM bytes of audio_array (a bytes-like object), used for playback and saving.
+        Shares memory with audio_array instead of copying it whenever it is contiguous.
+        """
+        if self._audio_data is None:
+            self._audio_array = np.ascontiguousarray(self.audio_array)
+            self._audio_data = memoryview(self._audio_array).cast("B")
+        return self._audio_data
+
+    def content_hash(self) -> str:
+        """
+        Hash of the audio content (sample rate, channel layout and samples).
+        Computed once and cached, since a VoiceManager is never modified in place.
+        """
+        if self._content_hash is None:
+            h = hashlib.sha1()
+            h.update(f"{self.rate}:{self.channels}:{self.left_channel.dtype}".encode())
+            for channel in self.channel_data:
+                h.update(np.ascontiguousarray(channel))
+            self._content_hash = h.hexdigest()
+        return self._content_hash
+
     def play_audio(self):
         """
         Play the audio (blocking)
         """
+        if pyaudio is None:
+            raise RuntimeError("PyAudio is not installed, cannot play audio")
         p = pyaudio.PyAudio()
         stream = p.open(
             format=pyaudio.paInt16, 
             channels=self.channels, rate=self.rate, 
             output=True)
-        stream.write(self.audio_data) 
+        # PyAudio only accepts bytes, so hand over the shared buffer block by block
+        block_size = 1024 * self._bytes_per_frame
+        for start in range(0, len(self.audio_data), block_size):
+            stream.write(bytes(self.audio_data[start:start + block_size]))
         stream.stop_stream()
         stream.close()
         p.terminate()
@@ -128,7 +331,7 @@ class VoiceManager():
         
         # 读取数据
         end_position = min(self._audio_position + bytes_to_read, len(self.audio_data))
-        data = self.audio_data[self._audio_position:end_position]
+        data = bytes(self.audio_data[self._audio_position:end_position])
         self._audio_position = end_position
         
         # 如果数据不足一帧，返回空数据并完成
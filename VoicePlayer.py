@@ -1,9 +1,12 @@
 import threading
 import VoiceManager
 import time
-import pyaudio
-import wave
 import numpy as np
+from Timeline import Timeline
+from AudioEngine import AudioEngine, get_default_engine
+from AssetBank import get_asset_bank
+from WavWriter import WavWriter, write_wav
+from scipy.ndimage import minimum_filter1d
 
 # 全局变量用于跟踪读取位置
 _audio_position = 0
@@ -11,140 +14,279 @@ _bytes_per_frame = None
 
 class VoicePlayer:
     '''非阻塞式地播放一个playlist'''
-    def __init__(self, voice_list: list[VoiceManager.VoiceManager], name: str = None):
-        self.voice_list = voice_list
-        self.p = pyaudio.PyAudio()
-        self.stream = None
+    def __init__(
+        self,
+        voice_list: list[VoiceManager.VoiceManager] = None,
+        name: str = None,
+        timeline: Timeline = None,
+    ):
+        """
+        voice_list 中的片段按顺序首尾相接摆放到时间线上；也可以直接传入编排好的 timeline。
+        时间线只引用各片段，不会拼接出完整音轨。
+        """
+        self.voice_list = voice_list if voice_list is not None else []
+        if timeline is None:
+            timeline = Timeline()
+            for voice in self.voice_list:
+                timeline.append(voice)
+        self.timeline = timeline
         self.name = name
+        self.engine = None
+        self._handle = None
 
     def get_total_track(self) -> VoiceManager.VoiceManager:
         """获取拼接后的完整音轨"""
-        total_track_array_left = np.concatenate(
-            [voice.left_channel for voice in self.voice_list]
-        )
-        if any(voice.right_channel is None for voice in self.voice_list):
-            total_track_array_right = None
-        else:
-                        total_track_array_right = np.concatenate(
-                [
-                    voice.right_channel
-                    for voice in self.voice_list
-                    if voice.right_channel is not None
-                ]
-            )
-
-        total_track = VoiceManager.VoiceManager(
-            left_channel=total_track_array_left,
-            right_channel=total_track_array_right,
-            sample_rate=self.voice_list[0].rate,
-            name=self.name,
-        )
-        return total_track
+        return self.timeline.to_voice_manager(name=self.name)
+
+    @property
+    def channels(self) -> int:
+        """输出声道数：所有片段都是立体声时为 2，否则为 1（与 get_total_track 一致）"""
+        return self.timeline.channels
+
+    @property
+    def frames(self) -> int:
+        return self.timeline.frames
+
+    @property
+    def rate(self) -> int:
+        return self.timeline.rate
 
-    def play(self):
-        # 拼接全轨
-        total_track = self.get_total_track()
+    def iter_blocks(self, block_size: int = 4096):
+        """
+        按固定大小的块依次产出整条音轨，不拼接全轨
+
+        每块是形状为 (声道数, 帧数) 的 int16 数组，最后一块可能不足 block_size
+        """
+        for start in range(0, self.frames, block_size):
+            yield self.timeline.render(start, block_size)
+
+    def play(self, engine: AudioEngine = None):
+        """
+        开始播放（非阻塞）
+
+        默认交给与采样率对应的共享引擎，多个播放器共用同一个输出流；
+        也可以传入自己的 AudioEngine（例如使用 NullSink / FileSink 的离线引擎）。
+        从时间线按需渲染，无需先拼接全轨。
+        """
         print(
-            f"{self.name} Total track frames: {total_track.frames}, total rate: {total_track.rate} Hz, total duration: {total_track.duration} seconds"
+            f"{self.name} Total track frames: {self.frames}, total rate: {self.rate} Hz, total duration: {self.timeline.duration} seconds"
         )
-        self.stream = self.p.open(
-            format=pyaudio.paInt16,
-            channels=total_track.channels,
-            rate=total_track.rate,
-            output=True,
-            stream_callback=total_track.callback,
-        )
-        self.stream.start_stream()
+        self.engine = engine if engine is not None else get_default_engine(self.rate)
+        self._handle = self.engine.add(self.timeline, name=self.name)
 
     def stop(self):
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
+        self.engine.remove(self._handle)
 
     def is_playing(self) -> bool:
-        return self.stream.is_active()
+        return self.engine.is_active(self._handle)
 
-    def save_to_wav(self, filename: str):
-        """将当前播放列表保存为WAV文件"""
-        total_track = self.get_total_track()
+    def save_to_wav(self, filename: str, block_size: int = 65536):
+        """
+        将当前播放列表保存为WAV文件
 
-        with wave.open(filename, "wb") as wf:
-            wf.setnchannels(total_track.channels)
-            wf.setsampwidth(total_track.sampwidth)
-            wf.setframerate(total_track.rate)
-            wf.writeframes(total_track.audio_data)
+        从时间线逐块渲染并写入，不拼接全轨；超过 4 GB 时自动写成 RF64
+        """
+        write_wav(filename, self.iter_blocks(block_size), self.channels, self.rate)
 
         print(f"已保存到: {filename}")
 
 
-def mix_and_save_players(voice_players: list[VoicePlayer], output_filename: str):
+def iter_mixed_blocks(
+    voice_players: list[VoicePlayer], channels: int, block_size: int = 65536
+):
+    """
+    逐块混合多个 VoicePlayer，产出形状为 (声道数, 帧数) 的 int32 块
+
+    各播放器的块按相同的 block_size 对齐，单声道音轨在立体声输出中同时写入左右声道。
+    内存占用只与 block_size 和音轨数有关，与总时长无关。
+    """
+    max_frames = max(player.frames for player in voice_players)
+    iterators = [player.iter_blocks(block_size) for player in voice_players]
+
+    for start in range(0, max_frames, block_size):
+        mixed = np.zeros((channels, min(block_size, max_frames - start)), dtype=np.int32)
+        for iterator in iterators:
+            block = next(iterator, None)
+            if block is None:
+                continue
+            # 单声道音轨：右声道也用左声道
+            mixed[:, : block.shape[1]] += block
+        yield mixed
+
+
+# int16 满幅
+FULL_SCALE = 2**15 - 1
+
+
+def _normalize_peak(make_blocks):
+    """
+    全局峰值归一化：第一遍统计整段混音的峰值，第二遍整体缩放到满幅
+    """
+    max_amplitude = 0
+    for mixed in make_blocks():
+        max_amplitude = max(max_amplitude, int(np.max(np.abs(mixed))))
+
+    # 计算缩放因子，使最大振幅不超过 int16 的范围
+    scale_factor = FULL_SCALE / max_amplitude if max_amplitude > 0 else 0
+
+    for mixed in make_blocks():
+        yield (mixed * scale_factor).astype(np.int16)
+
+
+def _normalize_block_peak(make_blocks):
+    """
+    分块峰值两遍法：第一遍只记录每块的峰值，第二遍按块衰减
+
+    每块允许的增益为 min(1, 满幅 / 块峰值)；块边界处取相邻两块中较小的增益，
+    块内线性过渡，因此不会削波，增益也不会在块边界处跳变。只衰减，不放大。
+    """
+    block_peaks = [int(np.max(np.abs(mixed))) for mixed in make_blocks()]
+    if not block_peaks:
+        return
+
+    block_gains = np.array(
+        [min(1.0, FULL_SCALE / peak) if peak > 0 else 1.0 for peak in block_peaks]
+    )
+    # 第 i 块起点的增益
+    boundary_gains = np.minimum(
+        block_gains, np.concatenate([block_gains[:1], block_gains[:-1]])
+    )
+    boundary_gains = np.append(boundary_gains, block_gains[-1])
+
+    for i, mixed in enumerate(make_blocks()):
+        frames = mixed.shape[1]
+        gain = np.linspace(
+            boundary_gains[i], boundary_gains[i + 1], frames, endpoint=False
+        )
+        yield (mixed * gain).astype(np.int16)
+
+
+def _normalize_limiter(make_blocks, lookahead_frames: int):
+    """
+    前视限幅器：单遍流式处理，输出比输入延迟 lookahead_frames - 1 帧
+
+    每个采样需要的增益 r[n] = min(1, 满幅 / |x[n]|)。先对 r 取长度为 L 的前向滑动最小值，
+    再做长度为 L 的后向滑动平均：平均窗口内每一项的最小值窗口都覆盖了 n，
+    所以结果一定不大于 r[n]，不会削波，同时增益在 L 帧内平滑地起落。
+    """
+    L = max(1, lookahead_frames)
+    pending = None  # 尚未输出的输入采样 (声道数, 帧数)
+    min_history = np.ones(L - 1)  # 最近 L-1 个前向最小值，用于滑动平均
+    skip = L - 1  # 开头补的静音帧数，输出时丢弃
+
+    def process(pending, min_history):
+        peak = np.max(np.abs(pending), axis=0).astype(np.float64)
+        required = np.minimum(1.0, FULL_SCALE / np.maximum(peak, 1.0))
+
+        ready = pending.shape[1] - L + 1
+        if ready <= 0:
+            return None, pending, min_history
+
+        # 前向最小值：m[n] = min(required[n : n + L])
+        forward_min = minimum_filter1d(required, size=L)[L // 2 : L // 2 + ready]
+
+        # 后向平均：a[n] = mean(m[n - L + 1 : n + 1])
+        extended = np.concatenate([min_history, forward_min])
+        cumulative = np.concatenate([[0.0], np.cumsum(extended)])
+        gain = (cumulative[L:] - cumulative[:-L]) / L
+
+        output = (pending[:, :ready] * gain).astype(np.int16)
+        return output, pending[:, ready:], extended[len(extended) - (L - 1) :]
+
+    for mixed in make_blocks():
+        if pending is None:
+            # 开头补 L-1 帧静音，让最前面的采样也有完整的平滑窗口
+            pending = np.zeros((mixed.shape[0], L - 1), dtype=mixed.dtype)
+        pending = np.concatenate([pending, mixed], axis=1)
+        output, pending, min_history = process(pending, min_history)
+        if output is not None:
+            output, skip = output[:, skip:], max(0, skip - output.shape[1])
+            if output.shape[1] > 0:
+                yield output
+
+    if pending is not None and pending.shape[1] > 0:
+        # 末尾补 L-1 帧静音，把延迟中的采样全部推出来
+        remaining = pending.shape[1] - skip
+        padded = np.concatenate(
+            [pending, np.zeros((pending.shape[0], L - 1), dtype=pending.dtype)], axis=1
+        )
+        output, _, _ = process(padded, min_history)
+        yield output[:, skip : skip + remaining]
+
+
+def _normalize_headroom(make_blocks, headroom_db: float):
+    """
+    固定余量：不做分析，按固定增益衰减后削波，单遍流式处理
+    """
+    gain = 10 ** (-headroom_db / 20)
+    for mixed in make_blocks():
+        yield np.clip(mixed * gain, -FULL_SCALE - 1, FULL_SCALE).astype(np.int16)
+
+
+def mix_and_save_players(
+    voice_players: list[VoicePlayer],
+    output_filename: str,
+    block_size: int = 65536,
+    normalize: str = "peak",
+    headroom_db: float = 6.0,
+    lookahead: float = 0.005,
+):
     """
     将多个 VoicePlayer 的音频混合并保存为单个WAV文件
 
+    按块流式混合并逐块写入文件，不会在内存中保存全长的音轨或混音结果。
+
     参数:
         voice_players: VoicePlayer 对象列表
         output_filename: 输出文件名
+        block_size: 每次处理的帧数
+        normalize: 归一化方式
+            "peak": 全局峰值归一化到满幅（两遍，与原行为一致）
+            "block_peak": 记录每块峰值，第二遍按块平滑衰减（两遍，只衰减）
+            "limiter": 前视限幅器（单遍）
+            "headroom": 固定余量衰减 + 削波（单遍）
+        headroom_db: "headroom" 模式下的衰减量（dB）
+        lookahead: "limiter" 模式下的前视时长（秒）
     """
     if not voice_players:
         raise ValueError("voice_players 列表不能为空")
 
-    # 获取所有音轨
-    all_tracks = [player.get_total_track() for player in voice_players]
-
     # 确定最大长度和采样率
-    max_frames = max(track.frames for track in all_tracks)
-    sample_rate = all_tracks[0].rate
+    max_frames = max(player.frames for player in voice_players)
+    sample_rate = voice_players[0].rate
 
-    # 确定输出声道数（所有音轨都支持立体声才用立体声）
-    has_stereo = any(track.channels == 2 for track in all_tracks)
+    # 确定输出声道数（任一音轨为立体声就用立体声）
+    has_stereo = any(player.channels == 2 for player in voice_players)
     channels = 2 if has_stereo else 1
 
     print(f"混合 {len(voice_players)} 个音轨...")
     print(f"最大帧数: {max_frames}, 采样率: {sample_rate}Hz, 声道: {channels}")
-
-    # 初始化混合数组
-    mixed_left = np.zeros(max_frames, dtype=np.int32)
-    mixed_right = np.zeros(max_frames, dtype=np.int32)
-
-    # 混合所有音轨
-    for i, track in enumerate(all_tracks):
-        # 将左声道添加到混合中
-        mixed_left[: track.frames] += track.left_channel.astype(np.int32)
-
-        # 处理右声道
-        if track.right_channel is not None:
-            # 单声道音轨：右声道也用左声道
-            right_channel = track.right_channel
-        else:
-            # 单声道音轨：右声道也用左声道
-            right_channel = track.left_channel
-
-        mixed_right[: track.frames] += right_channel.astype(np.int32)
-
-        print(f"  音轨 {i+1}: {track.frames} 帧, {track.channels} 声道")
-
-    # 归一化处理（防止溢出）
-    max_amplitude = max(np.max(np.abs(mixed_left)), np.max(np.abs(mixed_right)))
-    if max_amplitude > 0:
-        # 计算缩放因子，使最大振幅不超过 int16 的范围
-        scale_factor = (2**15 - 1) / max_amplitude
-        mixed_left = (mixed_left * scale_factor).astype(np.int16)
-        mixed_right = (mixed_right * scale_factor).astype(np.int16)
-
-    # 根据声道数合并数据
-    if channels == 2:
-        # 立体声：交错左右声道
-        mixed_array = np.column_stack((mixed_left, mixed_right)).flatten()
+    for i, player in enumerate(voice_players):
+        print(f"  音轨 {i+1}: {player.frames} 帧, {player.channels} 声道")
+
+    max_amplitude = 0
+
+    def make_blocks():
+        # 顺便记录混音的峰值，用于最后打印
+        nonlocal max_amplitude
+        for mixed in iter_mixed_blocks(voice_players, channels, block_size):
+            max_amplitude = max(max_amplitude, int(np.max(np.abs(mixed))))
+            yield mixed
+
+    if normalize == "peak":
+        blocks = _normalize_peak(make_blocks)
+    elif normalize == "block_peak":
+        blocks = _normalize_block_peak(make_blocks)
+    elif normalize == "limiter":
+        blocks = _normalize_limiter(make_blocks, int(lookahead * sample_rate))
+    elif normalize == "headroom":
+        blocks = _normalize_headroom(make_blocks, headroom_db)
     else:
-        # 单声道：只使用左声道
-        mixed_array = mixed_left
+        raise ValueError(f"未知的归一化方式: {normalize}")
 
-    # 保存为WAV文件
-    with wave.open(output_filename, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(2)  # int16 = 2 bytes
-        wf.setframerate(sample_rate)
-        wf.writeframes(mixed_array.tobytes())
+    # 逐块写入WAV文件
+    with WavWriter(output_filename, channels, sample_rate) as writer:
+        writer.write_blocks(blocks)
 
     duration = max_frames / sample_rate
     print("混合完成！")
@@ -157,10 +299,11 @@ if __name__ == "__main__":
 
 
     def demo1():
-        voice_1 = VoiceManager.VoiceManager(wave_filename="./assets/water.wav")
-        voice_2 = VoiceManager.VoiceManager(wave_filename="./assets/bike_1.wav")
-        voice_3 = VoiceManager.VoiceManager(wave_filename="./assets/shop_1.wav")
-        voice_4 = VoiceManager.VoiceManager(wave_filename="./assets/bike_2.wav")
+        bank = get_asset_bank("./assets")
+        voice_1 = bank.get("water.wav")
+        voice_2 = bank.get("bike_1.wav")
+        voice_3 = bank.get("shop_1.wav")
+        voice_4 = bank.get("bike_2.wav")
         voice_list = [voice_1, voice_2]
         voice_list_2 = [voice_3, voice_4]
 
@@ -206,8 +349,9 @@ if __name__ == "__main__":
                 total_duration: 目标总时长(秒)
                 irrational_number: 无理数(如 π, e, √2 等)
             """
-            # 获取所有可用的音频文件
-            audio_files = sorted([f for f in os.listdir(ASSETS_DIR) if f.endswith('.wav')])
+            # 获取所有可用的音频文件，素材库只读取文件头建立索引
+            bank = get_asset_bank(ASSETS_DIR)
+            audio_files = bank.names()
 
             # 将无理数转换为小数字符串(取前100位小数)
             decimal_str = f"{abs(irrational_number):.100f}".replace('.', '')[1:100]
@@ -215,12 +359,11 @@ if __name__ == "__main__":
             print(f"无理数种子: {irrational_number}")
             print(f"小数部分(前100位): {decimal_str}")
 
-            # 加载所有音频并记录时长
+            # 记录所有音频的时长（来自文件头，不解码）
             audio_info = {}
             for audio_file in audio_files:
-                vm = VoiceManager.VoiceManager(wave_filename=os.path.join(ASSETS_DIR, audio_file))
-                audio_info[audio_file] = vm.duration
-                print(f"  {audio_file}: {vm.duration:.2f}秒")
+                audio_info[audio_file] = bank.info(audio_file).duration
+                print(f"  {audio_file}: {audio_info[audio_file]:.2f}秒")
 
             # 根据无理数的小数特征选择音频
             selected_voices = []
@@ -247,13 +390,13 @@ if __name__ == "__main__":
                 duration_factor = (num + 1) / 100.0
                 target_voice_duration = min(remaining_duration * duration_factor, remaining_duration)
 
-                # 加载音频
-                voice = VoiceManager.VoiceManager(wave_filename=os.path.join(ASSETS_DIR, audio_file))
+                # 加载音频：同一文件只映射一次，这里拿到的是共享缓冲区上的视图
+                voice = bank.get(audio_file)
 
                 # 如果需要调整时长
                 if voice.duration < target_voice_duration:
                     # 拉伸音频
-                    voice = EFX.strech(voice, target_voice_duration)
+                    voice = EFX.stretch(voice, target_voice_duration)
                     print(f"  选择: {audio_file} ({voice.duration:.2f}s -> 拉伸到 {target_voice_duration:.2f}s)")
                 elif voice.duration > target_voice_duration:
                     # 截取音频
@@ -270,7 +413,7 @@ if __name__ == "__main__":
                 first_voice = selected_voices[0]
                 if remaining_duration > first_voice.duration:
                     # 拉伸
-                    fill_voice = EFX.strech(first_voice, remaining_duration)
+                    fill_voice = EFX.stretch(first_voice, remaining_duration)
                     print(f"  填充: {first_voice.name if hasattr(first_voice, 'name') else 'first'} (拉伸到 {remaining_duration:.2f}s)")
                 else:
                     # 截取
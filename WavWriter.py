@@ -0,0 +1,235 @@
+import struct
+import numpy as np
+from typing import Union
+from VoiceManager import quantize
+
+# 普通 RIFF 的大小字段是 32 位，超过时 close 把文件头改写成 RF64
+RIFF_LIMIT = 2**32 - 1
+
+CONTAINERS = ("auto", "wav", "rf64", "w64")
+SAMPLE_FORMATS = ("int16", "float32")
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+
+# Sony Wave64 的块标识是 GUID
+_W64_RIFF = b"riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00"
+_W64_WAVE = b"wave\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a"
+_W64_FMT = b"fmt \xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a"
+_W64_DATA = b"data\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a"
+
+# ds64 块的内容：RIFF 大小、data 大小、采样帧数（各 8 字节）和空的表长度（4 字节）
+_DS64_SIZE = 28
+
+
+class WavWriter:
+    """
+    流式 WAV 写入
+
+    先写出大小字段为 0 的文件头，之后每个块直接追加到文件，close 时回填文件头中的大小，
+    内存占用只与块大小有关。普通 RIFF 文件头中预留了一个 JUNK 块，
+    写入的数据超过 4 GB 时 close 把它改写成 RF64 的 ds64 块（EBU Tech 3306）；
+    container="w64" 时写 Sony Wave64，所有大小字段都是 64 位。
+
+    用法::
+
+        with WavWriter("out.wav", channels=2, sample_rate=48000) as writer:
+            for block in player.iter_blocks():
+                writer.write(block)
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        channels: int,
+        sample_rate: int,
+        sample_format: str = "int16",
+        container: str = "auto",
+    ):
+        """
+        Args:
+            filename: 输出文件名
+            channels: 声道数
+            sample_rate: 采样率
+            sample_format: "int16"（16 位 PCM）或 "float32"（32 位浮点）
+            container: "auto"（RIFF，超过 4 GB 时自动改为 RF64）、"wav"（只允许 RIFF）、
+                "rf64"（总是 RF64）或 "w64"
+        """
+        if container not in CONTAINERS:
+            raise ValueError(f"未知的文件格式: {container}，可选 {CONTAINERS}")
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"未知的采样格式: {sample_format}，可选 {SAMPLE_FORMATS}")
+
+        self.filename = filename
+        self.channels = channels
+        self.rate = sample_rate
+        self.sample_format = sample_format
+        self.container = container
+        self.dtype = np.dtype("<i2" if sample_format == "int16" else "<f4")
+        self.frames_written = 0
+        self.data_bytes = 0
+
+        self._file = open(filename, "wb")
+        try:
+            self._write_header()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _fmt_chunk(self) -> bytes:
+        block_align = self.channels * self.dtype.itemsize
+        return struct.pack(
+            "<HHIIHH",
+            (
+                _WAVE_FORMAT_PCM
+                if self.sample_format == "int16"
+                else _WAVE_FORMAT_IEEE_FLOAT
+            ),
+            self.channels,
+            self.rate,
+            self.rate * block_align,
+            block_align,
+            8 * self.dtype.itemsize,
+        )
+
+    def _write_header(self):
+        fmt = self._fmt_chunk()
+        if self.container == "w64":
+            # W64 的块大小包含 24 字节的块头，块按 8 字节对齐
+            fmt_chunk = _W64_FMT + struct.pack("<Q", 24 + len(fmt)) + fmt
+            fmt_chunk += b"\x00" * (-len(fmt_chunk) % 8)
+            header = _W64_RIFF + struct.pack("<Q", 0) + _W64_WAVE + fmt_chunk
+            self._data_size_offset = len(header) + 16
+            header += _W64_DATA + struct.pack("<Q", 0)
+        else:
+            header = b"RIFF" + struct.pack("<I", 0) + b"WAVE"
+            self._reserved_offset = len(header)
+            # RF64 需要的 ds64 块位置先用同样大小的 JUNK 块占住
+            header += b"JUNK" + struct.pack("<I", _DS64_SIZE) + b"\x00" * _DS64_SIZE
+            header += b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            self._data_size_offset = len(header) + 4
+            header += b"data" + struct.pack("<I", 0)
+        self._file.write(header)
+        self._header_bytes = len(header)
+
+    def _to_samples(self, block: np.ndarray) -> np.ndarray:
+        """把块转换成要写入的采样类型；浮点块按 [-1, 1] 量化，其它整数块削波到 int16"""
+        block = np.asarray(block)
+        if self.sample_format == "float32":
+            if block.dtype.kind != "f":
+                # 整数采样按 int16 满幅归一化
+                return (block / np.float32(32768.0)).astype(self.dtype)
+            return block.astype(self.dtype, copy=False)
+        if block.dtype.kind == "f":
+            return quantize(block)
+        if block.dtype != np.int16:
+            return np.clip(block, -(2**15), 2**15 - 1).astype(np.int16)
+        return block
+
+    def write(self, block: np.ndarray):
+        """
+        写入一个形状为 (声道数, 帧数) 的块，单声道时也可以是一维数组
+        """
+        samples = self._to_samples(block)
+        if samples.ndim == 1:
+            samples = samples[np.newaxis]
+        if samples.shape[0] != self.channels:
+            raise ValueError(
+                f"块有 {samples.shape[0]} 个声道，文件有 {self.channels} 个"
+            )
+        # 交错各声道: (声道数, 帧数) -> (帧数, 声道数)
+        self.write_interleaved(samples.T)
+
+    def write_interleaved(self, block: Union[np.ndarray, bytes]):
+        """
+        写入已交错的块：形状为 (帧数, 声道数) 的数组，或已经是目标采样格式的字节串
+        """
+        if isinstance(block, np.ndarray):
+            block = np.ascontiguousarray(self._to_samples(block), dtype=self.dtype)
+        data = memoryview(block).cast("B")
+        frame_bytes = self.channels * self.dtype.itemsize
+        if len(data) % frame_bytes:
+            raise ValueError(f"块的字节数 {len(data)} 不是整帧")
+        if (
+            self.container == "wav"
+            and self._header_bytes + self.data_bytes + len(data) - 8 > RIFF_LIMIT
+        ):
+            raise ValueError('超过 4 GB 的数据需要 container="auto"、"rf64" 或 "w64"')
+        self._file.write(data)
+        self.data_bytes += len(data)
+        self.frames_written += len(data) // frame_bytes
+
+    def write_blocks(self, blocks) -> int:
+        """
+        逐个写入 (声道数, 帧数) 块的迭代器，块边产生边写入
+
+        Returns:
+            int: 本次写入的帧数
+        """
+        start = self.frames_written
+        for block in blocks:
+            self.write(block)
+        return self.frames_written - start
+
+    def close(self):
+        """回填文件头中的大小并关闭文件"""
+        if self._file.closed:
+            return
+        try:
+            file_size = self._header_bytes + self.data_bytes
+            if self.container == "w64":
+                self._file.seek(16)
+                self._file.write(struct.pack("<Q", file_size))
+                self._file.seek(self._data_size_offset)
+                self._file.write(struct.pack("<Q", 24 + self.data_bytes))
+            elif self.container == "rf64" or file_size - 8 > RIFF_LIMIT:
+                self._file.seek(0)
+                self._file.write(b"RF64" + struct.pack("<I", 0xFFFFFFFF))
+                self._file.seek(self._reserved_offset)
+                self._file.write(
+                    b"ds64"
+                    + struct.pack(
+                        "<IQQQI",
+                        _DS64_SIZE,
+                        file_size - 8,
+                        self.data_bytes,
+                        self.frames_written,
+                        0,
+                    )
+                )
+                self._file.seek(self._data_size_offset)
+                self._file.write(struct.pack("<I", 0xFFFFFFFF))
+            else:
+                self._file.seek(4)
+                self._file.write(struct.pack("<I", file_size - 8))
+                self._file.seek(self._data_size_offset)
+                self._file.write(struct.pack("<I", self.data_bytes))
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_wav(
+    filename: str,
+    blocks,
+    channels: int,
+    sample_rate: int,
+    sample_format: str = "int16",
+    container: str = "auto",
+) -> int:
+    """
+    把 (声道数, 帧数) 块的迭代器流式写成 WAV 文件，例如 VoicePlayer.iter_blocks()、
+    Sampler.render_blocks()；也可以直接传入一个完整的 (声道数, 帧数) 数组
+
+    Returns:
+        int: 写入的帧数
+    """
+    if isinstance(blocks, np.ndarray):
+        blocks = [blocks]
+    with WavWriter(filename, channels, sample_rate, sample_format, container) as writer:
+        return writer.write_blocks(blocks)
@@ -0,0 +1,292 @@
+"""
+EFX / AMP / 混音热点路径的基准测试
+
+每个操作在独立的子进程中运行，使用可配置长度、声道数和采样率的合成信号，
+记录耗时、峰值 RSS 和 Python 层（含 numpy）的内存分配，结果保存为 JSON，
+便于比较不同版本之间的回归。不需要声卡或 PyAudio。
+
+用法:
+    python benchmark.py --seconds 10 --channels 2 --output bench.json
+    python benchmark.py --ops stretch,filter --repeat 5
+    python benchmark.py --compare old.json new.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录峰值 RSS
+    resource = None
+
+import numpy as np
+
+
+def make_signal(seconds: float, channels: int, sample_rate: int, seed: int = 0):
+    """
+    生成确定性的合成测试信号：带衰减包络的 440Hz 谐波音 + 少量噪声
+
+    Returns:
+        VoiceManager: int16 合成信号
+    """
+    from VoiceManager import VoiceManager
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = sum(np.sin(2 * np.pi * 440 * k * t) / k for k in range(1, 6))
+    envelope = np.exp(-3 * (t % 1.0))
+
+    data = []
+    for c in range(channels):
+        signal = 0.5 * tone * envelope + 0.02 * rng.standard_normal(len(t))
+        data.append((signal / np.max(np.abs(signal)) * 20000).astype(np.int16))
+
+    return VoiceManager(
+        left_channel=data[0],
+        right_channel=data[1] if channels > 1 else None,
+        sample_rate=sample_rate,
+    )
+
+
+def _reset_pitch_cache():
+    import AMP
+
+    AMP.set_pitch_cache(AMP.PitchCache())
+
+
+def _get_pitch(vm):
+    import AMP
+
+    return AMP.get_pitch(vm, use_cache=False)
+
+
+def _precise_tune(vm):
+    import AMP
+
+    _reset_pitch_cache()
+    return AMP.precise_tune(vm, target_pitch=470.0)
+
+
+def _tune(vm):
+    import AMP
+
+    return AMP.tune(vm, 3)
+
+
+def _tune_medium(vm):
+    import AMP
+
+    return AMP.tune(vm, 3, quality="medium")
+
+
+def _tune_low(vm):
+    import AMP
+
+    return AMP.tune(vm, 3, quality="low")
+
+
+def _tune_many(vm):
+    import AMP
+
+    return AMP.tune_many(vm, [-4, -2, 2, 4], max_workers=1)
+
+
+def _stretch(vm):
+    import EFX
+
+    return EFX.stretch(vm, vm.duration * 1.5)
+
+
+def _filter(vm):
+    import EFX
+
+    return EFX.filter(vm, 100, 4000)
+
+
+def _inverse(vm):
+    import EFX
+
+    return EFX.inverse(vm)
+
+
+def _get_total_track(vm):
+    from VoicePlayer import VoicePlayer
+
+    return VoicePlayer([vm] * 8).get_total_track()
+
+
+def _mix_and_save_players(vm):
+    from VoicePlayer import VoicePlayer, mix_and_save_players
+
+    players = [VoicePlayer([vm] * 2) for _ in range(4)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mix_and_save_players(players, os.path.join(tmp_dir, "mix.wav"))
+
+
+OPERATIONS = {
+    "get_pitch": _get_pitch,
+    "precise_tune": _precise_tune,
+    "tune": _tune,
+    "tune_medium": _tune_medium,
+    "tune_low": _tune_low,
+    "tune_many": _tune_many,
+    "stretch": _stretch,
+    "filter": _filter,
+    "inverse": _inverse,
+    "get_total_track": _get_total_track,
+    "mix_and_save_players": _mix_and_save_players,
+}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_operation(name: str, config: dict) -> dict:
+    """在子进程中运行一个操作并测量"""
+    operation = OPERATIONS[name]
+    vm = make_signal(config["seconds"], config["channels"], config["rate"])
+    baseline_rss = _peak_rss_mb()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 预热：排除 numba JIT 等一次性开销
+        for _ in range(config["warmup"]):
+            operation(vm)
+
+        times = []
+        for _ in range(config["repeat"]):
+            started = time.perf_counter()
+            operation(vm)
+            times.append(time.perf_counter() - started)
+
+        # 内存分配单独测一次，tracemalloc 会拖慢计时
+        tracemalloc.start()
+        operation(vm)
+        alloc_net, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    peak_rss = _peak_rss_mb()
+    return {
+        "name": name,
+        "repeat": config["repeat"],
+        "wall_time_s": {
+            "min": min(times),
+            "mean": sum(times) / len(times),
+            "max": max(times),
+        },
+        "peak_rss_mb": peak_rss,
+        "peak_rss_delta_mb": None if peak_rss is None else peak_rss - baseline_rss,
+        "alloc_peak_mb": alloc_peak / 1024**2,
+        "alloc_net_mb": alloc_net / 1024**2,
+    }
+
+
+def run_benchmarks(ops: list, config: dict) -> dict:
+    """
+    依次在全新的子进程中运行每个操作，保证峰值 RSS 互不影响
+
+    Returns:
+        dict: 包含运行环境信息和每个操作结果的字典，可直接保存为 JSON
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in ops:
+        print(f"运行 {name} ...", flush=True)
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_operation, (name, config))
+        peak_rss = result["peak_rss_mb"]
+        print(
+            f"  {result['wall_time_s']['min'] * 1000:.1f} ms, "
+            f"峰值 RSS {'-' if peak_rss is None else f'{peak_rss:.1f}'} MB, "
+            f"分配峰值 {result['alloc_peak_mb']:.1f} MB"
+        )
+        results.append(result)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "config": config,
+        },
+        "results": results,
+    }
+
+
+def compare(old_filename: str, new_filename: str):
+    """对比两次结果，打印每个操作的耗时和内存变化（新 / 旧）"""
+    with open(old_filename) as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_filename) as f:
+        new = {r["name"]: r for r in json.load(f)["results"]}
+
+    print(f"{'操作':<24}{'耗时':>12}{'分配峰值':>12}{'峰值RSS':>12}")
+    for name in new:
+        if name not in old:
+            continue
+
+        def ratio(key, sub=None):
+            a = old[name][key] if sub is None else old[name][key][sub]
+            b = new[name][key] if sub is None else new[name][key][sub]
+            if not a or b is None:
+                return "-"
+            return f"{b / a:.2f}x"
+
+        print(
+            f"{name:<24}{ratio('wall_time_s', 'min'):>12}"
+            f"{ratio('alloc_peak_mb'):>12}{ratio('peak_rss_mb'):>12}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--seconds", type=float, default=5.0, help="合成信号时长（秒）")
+    parser.add_argument("--channels", type=int, default=2, choices=[1, 2])
+    parser.add_argument("--rate", type=int, default=48000, help="采样率")
+    parser.add_argument("--repeat", type=int, default=3, help="计时重复次数")
+    parser.add_argument("--warmup", type=int, default=1, help="预热次数")
+    parser.add_argument(
+        "--ops", default=",".join(OPERATIONS), help="逗号分隔的操作列表"
+    )
+    parser.add_argument("--output", default=None, help="结果 JSON 文件")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两个结果文件"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = [op for op in ops if op not in OPERATIONS]
+    if unknown:
+        parser.error(f"未知的操作: {', '.join(unknown)}")
+
+    config = {
+        "seconds": args.seconds,
+        "channels": args.channels,
+        "rate": args.rate,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+    }
+    report = run_benchmarks(ops, config)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"结果已保存到: {args.output}")
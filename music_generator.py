@@ -2,6 +2,7 @@ import math
 from decimal import Decimal, getcontext
 from midiutil import MIDIFile
 import numpy as np
+from DigitSource import get_digit_source
 
 # ==============================================================================
 # 1. 数据定义 (翻译自 In[2], In[6], In[12])
@@ -51,40 +52,61 @@ cs = [
 # ==============================================================================
 
 
+PITCH_MAP = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+ACCIDENTAL_MAP = {"#": 1, "b": -1}
+
+
 def note_to_midi_pitch(note_name):
     """将音符名称 (如 "C4") 转换为 MIDI 音高值 (如 60)"""
-    pitch_map = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
-    accidental_map = {"#": 1, "b": -1}
-
     note = note_name[0].upper()
     octave = int(note_name[-1])
 
-    pitch = pitch_map[note]
+    pitch = PITCH_MAP[note]
 
     if len(note_name) > 2:
         accidental = note_name[1]
-        if accidental in accidental_map:
-            pitch += accidental_map[accidental]
+        if accidental in ACCIDENTAL_MAP:
+            pitch += ACCIDENTAL_MAP[accidental]
 
     return 12 * (octave + 1) + pitch
 
 
+# 预先把音符名称表转换成 MIDI 音高表，生成时只做整数索引
+c_pitches = np.array([[note_to_midi_pitch(note) for note in chord] for chord in c])
+cs_pitches = np.array([[note_to_midi_pitch(note) for note in chord] for chord in cs])
+pa_pitches = [[note_to_midi_pitch(note) for note in seq] for seq in pa]
+
+# MIDI Program Numbers (see General MIDI standard)
+VIOLIN = 41
+ACOUSTIC_GRAND_PIANO = 1
+FLUTE = 74
+
+MELODY_VOL = 110
+
+
+# 浮点常量只有约 17 位有效数字，把它们映射到真实常数，从 DigitSource 取任意多位
+KNOWN_CONSTANTS = {math.pi: "pi", math.e: "e", math.sqrt(2): "sqrt2"}
+
+
 def get_digits(number, num_digits):
     """
-    获取一个数字的前 n 位小数。等效于 Mathematica 的 RealDigits。
-    我们使用 decimal 模块来处理高精度。
+    获取一个数字的前 n 位数字。等效于 Mathematica 的 RealDigits。
+
+    number 可以是常数名 ("pi", "e", "sqrt2") 或等于 np.pi / np.e / np.sqrt(2) 的浮点数，
+    此时返回常数的真实数字 (计算结果缓存在磁盘上)；其它数字按 Decimal 展开浮点数本身。
+    Mathematica `RealDigits[Pi, 10, 5]` -> {{3, 1, 4, 1, 5}, 1}，我们返回 {3, 1, 4, 1, 5} 部分。
+
+    Returns:
+        np.ndarray: 每个元素是一位数字
     """
+    name = number if isinstance(number, str) else KNOWN_CONSTANTS.get(number)
+    if name is not None:
+        return get_digit_source(name).digits(num_digits)
+
     getcontext().prec = num_digits + 5  # 设置足够的精度
     d = Decimal(number)
     s = str(d).replace(".", "")
-    # 如果是 pi, e 等，它们会以 "31415..." 的形式出现
-    # 如果是 sqrt(2)，它会是 "14142..."
-    # 我们需要确保只取小数点后的数字，但代码逻辑似乎用了整数部分
-    # Mathematica 的 RealDigits[[1]] 返回一个数字列表。
-    # 为了匹配 Mathematica 的行为，我们返回一个整数列表。
-    # Mathematica `RealDigits[Pi, 10, 5]` -> {{3, 1, 4, 1, 5}, 1}
-    # 我们需要这个 {3, 1, 4, 1, 5} 部分
-    return [int(digit) for digit in s[:num_digits]]
+    return np.array([int(digit) for digit in s[:num_digits]], dtype=np.uint8)
 
 
 # ==============================================================================
@@ -112,7 +134,7 @@ def add_accomp(midi_file, start_measure, num_measures, slshli, moveli):
         # 添加小提琴低音 (Violin Bassline)
         # 每个音符持续 2 拍
         for n in range(4):  # n 是和弦索引 C, Am, F, G
-            pitch = note_to_midi_pitch(c[n][0])
+            pitch = int(c_pitches[n, 0])
             time = 8 * s + 2 * n  # 开始时间
             duration = 2  # 持续时间
             midi_file.addNote(track_violin, channel, pitch, time, duration, vol)
@@ -126,11 +148,9 @@ def add_accomp(midi_file, start_measure, num_measures, slshli, moveli):
                 # 3;;5 -> Python slice [2:5]
                 # 1;;4 -> Python slice [0:4]
                 if m in moveli:
-                    chord_notes = c[n][2:5]
+                    pitches = c_pitches[n, 2:5].tolist()
                 else:
-                    chord_notes = c[n][0:4]
-
-                pitches = [note_to_midi_pitch(note) for note in chord_notes]
+                    pitches = c_pitches[n, 0:4].tolist()
 
                 # 处理切分节奏 (slshli)
                 # Mathematica: sl[..., MemberQ[slshli,m]]
@@ -156,6 +176,66 @@ def add_accomp(midi_file, start_measure, num_measures, slshli, moveli):
                         )
 
 
+def gen_events(g, num_measures):
+    """
+    由数字序列批量计算主旋律的音符事件 (翻译自 Gen 中的主旋律 Table)。
+
+    逐步循环被改写成 numpy 数组运算：先算出每个小节的节奏表 mainli，
+    再对全部 32 * (num_measures - 1) 个十六分音符位置一次性求出是否发声、音高和时间。
+
+    Returns:
+        dict: 每个发声音符一项的列数组 "pitch", "time", "duration", "velocity"，
+        以及主旋律轨道的音色切换 "program_time", "program"（每个有音符的小节一次）
+    """
+    g = np.asarray(g, dtype=np.int8)
+    num_steps = 32 * max(num_measures - 1, 0)
+
+    # mainli: 控制主旋律的节奏 (奇偶小节疏密交错)
+    # 奇数小节 s 取 g[8s-7 : 8s-1]，偶数小节取 g[8s-11 : 8s]；越界部分与列表切片一样截断
+    s = np.arange(1, num_measures + 1)
+    odd = s % 2 != 0
+    start = np.where(odd, 8 * s - 7, 8 * s - 11)
+    length = np.where(odd, 6, 11)
+    offsets = np.arange(11)
+    idx = start[:, None] + offsets
+    valid = (offsets < length[:, None]) & (idx < len(g))
+    # in_mainli[m, r]: 节奏位置 r (1..8) 是否出现在第 m 个小节的 mainli 中
+    in_mainli = np.zeros((num_measures, 10), dtype=bool)
+    rows = np.broadcast_to(np.arange(num_measures)[:, None], idx.shape)
+    in_mainli[rows[valid], g[idx[valid]]] = True
+
+    # i - 1 (0-based 的十六分音符位置)
+    k = np.arange(num_steps, dtype=np.int32)
+    measure = k // 32
+    eighth = k // 8  # M: Ceiling[i/8] - 1
+    rhythm_pos = k % 8 + 1  # M: Mod[i,8,1]
+
+    # M: MemberQ[mainli[[...]], Mod[i,8,1]] || Mod[Ceiling[i/8],4] == 3
+    play = in_mainli[measure, rhythm_pos] | ((eighth + 1) % 4 == 3)
+    k, measure, eighth = k[play], measure[play], eighth[play]
+
+    # M: cs[[Mod[Ceiling[i/8],4,1], Mod[g[[Mod[i,8,1]+Floor[i/32]*8]],6]+2]]
+    g_idx = k % 8 + measure * 8
+    overflow = g_idx >= len(g)
+    if overflow.any():
+        print(f"Warning: {overflow.sum()} melody steps exceed g length={len(g)}")
+        g_idx = g_idx % len(g)  # 循环使用
+    pitch = cs_pitches[eighth % 4, g[g_idx] % 6 + 1]
+
+    # 奇数小节 (0-based) 用钢琴，偶数小节用长笛
+    program_measure = np.unique(measure)
+    program = np.where(program_measure % 2 != 0, ACOUSTIC_GRAND_PIANO, FLUTE)
+
+    return {
+        "pitch": pitch,
+        "time": 8 + k * 0.25,
+        "duration": np.full(len(k), 0.25),
+        "velocity": np.full(len(k), MELODY_VOL),
+        "program_time": program_measure * 8,
+        "program": program,
+    }
+
+
 def gen_music(number, num_measures, output_filename):
     """
     主生成函数。等效于 Mathematica 的 Gen。
@@ -172,17 +252,6 @@ def gen_music(number, num_measures, output_filename):
     g = get_digits(number, num_digits_needed)
     print(f"Generated {len(g)} digits for processing")
 
-    # mainli: 控制主旋律的节奏 (奇偶小节疏密交错)
-    # Mathematica indices are 1-based, Python are 0-based.
-    mainli = []
-    for s in range(1, num_measures + 1):
-        if s % 2 != 0:  # 奇数小节
-            # M: 8s-6;;8s-1 -> P: [8s-7 : 8s-1]
-            mainli.append(g[8 * s - 7 : 8 * s - 1])
-        else:  # 偶数小节
-            # M: 8s-10;;8s -> P: [8s-11 : 8s]
-            mainli.append(g[8 * s - 11 : 8 * s])
-
     # slshli, moveli: 控制伴奏的节奏和转位
     # M: Mod[g[[no]],4,1] -> P: (g[no-1] % 4) + 1
     slshli = [[(g[no - 1] % 4) + 1] for no in range(1, num_measures + 1)]
@@ -205,11 +274,6 @@ def gen_music(number, num_measures, output_filename):
     midi_file.addTempo(2, 0, tempo)
     midi_file.addTempo(3, 0, tempo)
 
-    # MIDI Program Numbers (see General MIDI standard)
-    VIOLIN = 41
-    ACOUSTIC_GRAND_PIANO = 1
-    FLUTE = 74
-
     midi_file.addProgramChange(0, 0, 0, VIOLIN)
     midi_file.addProgramChange(1, 0, 0, ACOUSTIC_GRAND_PIANO)
     # Track 2's instrument will change during generation
@@ -225,54 +289,20 @@ def gen_music(number, num_measures, output_filename):
             add_accomp(midi_file, no, 2, slshli[no], moveli[no])
 
     # 生成主旋律
-    melody_vol = 110
     # M: Table[If[...], {i, 1, 32*(st-1)}]
-    for i in range(1, 32 * (num_measures - 1) + 1):
-        # 计算节奏和位置
-        # M: Ceiling[i/(8*4)] -> P: math.ceil(i/32)
-        measure_idx_1based = math.ceil(i / 32)
-        measure_idx_0based = measure_idx_1based - 1
-
-        # M: Mod[i,8,1] -> P: (i-1) % 8 + 1
-        rhythm_pos = (i - 1) % 8 + 1
-
-        # M: Mod[Ceiling[i/8],4] == 3
-        quarter_beat_of_measure = math.ceil(i / 8) % 4
-
-        # 检查是否应该播放音符
-        play_note = False
-        if rhythm_pos in mainli[measure_idx_0based] or quarter_beat_of_measure == 3:
-            play_note = True
-
-        if play_note:
-            # 确定乐器
-            # M: If[OddQ[Floor[i/32-0.01]],"Piano","Flute"]
-            is_odd_measure = math.floor((i - 1) / 32) % 2 != 0
-            instrument = ACOUSTIC_GRAND_PIANO if is_odd_measure else FLUTE
-            # We need to add a program change event at the start of the measure
-            measure_start_time = measure_idx_0based * 8
-            midi_file.addProgramChange(2, 0, measure_start_time, instrument)
-
-            # 确定音高
-            # M: cs[[Mod[Ceiling[i/8],4,1], ...]]
-            chord_idx = (math.ceil(i / 8) - 1) % 4
-
-            # M: Mod[g[[Mod[i,8,1]+Floor[i/32]*8]],6]+2
-            g_idx = ((i - 1) % 8) + math.floor((i - 1) / 32) * 8
-            # In M, indices are 1-based. `+2` means indices 2..7.
-            # In Python, this means indices 1..6.
-            if g_idx >= len(g):
-                print(f"Warning: g_idx={g_idx} exceeds g length={len(g)} at i={i}")
-                g_idx = g_idx % len(g)  # 循环使用
-            note_in_chord_idx = (g[g_idx] % 6) + 1
-
-            note_name = cs[chord_idx][note_in_chord_idx]
-            pitch = note_to_midi_pitch(note_name)
-
-            # M: {8+(i-1)/4, 8+i/4} -> start_time = 8 + (i-1)/4, duration = 1/4
-            time = 8 + (i - 1) * 0.25
-            duration = 0.25
-            midi_file.addNote(2, 0, pitch, time, duration, melody_vol)
+    events = gen_events(g, num_measures)
+    # 每个有音符的小节开头切换一次音色 (钢琴 / 长笛)
+    for time, program in zip(
+        events["program_time"].tolist(), events["program"].tolist()
+    ):
+        midi_file.addProgramChange(2, 0, time, program)
+    for pitch, time, duration, velocity in zip(
+        events["pitch"].tolist(),
+        events["time"].tolist(),
+        events["duration"].tolist(),
+        events["velocity"].tolist(),
+    ):
+        midi_file.addNote(2, 0, pitch, time, duration, velocity)
 
     # 生成点缀音 (Embellishment)
     # M: Table[..., {n,1,Floor[st/4]}]
@@ -280,8 +310,7 @@ def gen_music(number, num_measures, output_filename):
     for n in range(1, math.floor(num_measures / 4) + 1):
         # M: {32n+(i-1)/16, 32n+i/16} -> start = 32n + (i-1)/16
         for i in range(len(pa)):
-            notes_to_play = pa[i]
-            pitches = [note_to_midi_pitch(note) for note in notes_to_play]
+            pitches = pa_pitches[i]
 
             # Mathematica 播放的是一个和弦，但时间非常短，形成琶音效果
             # 我们在这里也把它作为一个和弦来添加
@@ -301,7 +330,7 @@ def gen_music(number, num_measures, output_filename):
 # ==============================================================================
 
 if __name__ == "__main__":
-    # 使用 numpy 获取高精度常量
+    # numpy 常量会被 get_digits 映射到真实常数的任意多位数字
     pi = np.pi
     e = np.e
     sqrt2 = np.sqrt(2)
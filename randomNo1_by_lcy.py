@@ -1,34 +1,39 @@
-from VoiceManager import VoiceManager
-import EFX
+from AssetBank import get_asset_bank
 from VoicePlayer import VoicePlayer, mix_and_save_players
-import AMP
+from EffectChain import EffectChain
+from BatchRenderer import render_batch
 import random
 import numpy as np
 import time
 
 if __name__ == "__main__":
 
-    voice_1 = VoiceManager(wave_filename="./assets/water.wav")
-    voice_2 = VoiceManager(wave_filename="./assets/bike_1.wav")
-    voice_3 = VoiceManager(wave_filename="./assets/shop_1.wav")
-    voice_4 = VoiceManager(wave_filename="./assets/bike_2.wav")
-    voice_5 = VoiceManager(wave_filename="./assets/wechat_notice.wav")
+    bank = get_asset_bank("./assets")
+    voice_1 = bank.get("water.wav")
+    voice_2 = bank.get("bike_1.wav")
+    voice_3 = bank.get("shop_1.wav")
+    voice_4 = bank.get("bike_2.wav")
+    voice_5 = bank.get("wechat_notice.wav")
     voice_list = [voice_1, voice_2]
     voice_list_2 = [voice_3, voice_4]
 
-    voice_list_3 = [None] * 30
-    for i in range(30):
-        change = random.randint(-100, 100)
-        voice_list_3[i] = AMP.precise_tune(voice_5, target_pitch=440 + change)
-        voice_list_3[i] = EFX.cut(voice_list_3[i], 0,0.8)
-        voice_list_3[i] = EFX.stretch(voice_list_3[i], 1.5)
+    # 效果链延迟执行：cut 被移到变调之前，只处理用到的前 0.8 秒
+    chain_5 = EffectChain(voice_5)
+
+    target_pitches_3 = [440 + random.randint(-100, 100) for i in range(30)]
+    chains_3 = []
+    for target_pitch in target_pitches_3:
+        chains_3.append(chain_5.precise_tune(target_pitch).cut(0, 0.8).stretch(1.5))
     
-    voice_list_4 = [None] * 60
-    for i in range(60):
-        change = random.randint(-100, 100)
-        voice_list_4[i] = AMP.precise_tune(voice_5, target_pitch=440 + change)
-        voice_list_4[i] = EFX.cut(voice_list_4[i], 0,0.8)
-        voice_list_4[i] = EFX.stretch(voice_list_4[i], 1)
+    target_pitches_4 = [440 + random.randint(-100, 100) for i in range(60)]
+    chains_4 = []
+    for target_pitch in target_pitches_4:
+        chains_4.append(chain_5.precise_tune(target_pitch).cut(0, 0.8).stretch(1))
+
+    # 90 个变体在进程池中并行渲染，voice_5 的采样只放进共享内存一次
+    rendered = render_batch(chains_3 + chains_4)
+    voice_list_3 = rendered[:30]
+    voice_list_4 = rendered[30:]
 
     # 创建播放器 并播放
     voice_player_1 = VoicePlayer(voice_list, name="voice_player_1")